@@ -1,28 +1,197 @@
 import os
 import sys
+import time
 import webbrowser
 import pandas as pd
 import sqlite3
 import json
+import uuid
+import datetime
+from contextlib import ExitStack
 from flask import (
     Flask, render_template, request, redirect, url_for,
-    flash, jsonify
+    flash, jsonify, Response, g
 )
-from db import load_csv_to_sqlite, load_aircraft_csv_to_sqlite
+from db import load_csv_to_sqlite, load_aircraft_csv_to_sqlite, ReadConnectionPool, warm_tables
 from build_full_org_tree import build_full_org_tree
+from hierarchy import SUBTREE_JOIN, HIERARCHY_TABLE, ancestor_path
+from rollup import get_rollup, get_trend, record_history, refresh_rollups, ROLLUP_TABLE
+from search import search_units
+from snapshot import TreeSnapshot
+from flat_tree import FlatTreeSnapshot, flat_paths
+from filtered_tree import AIRCRAFT_FILTERS, FilteredTreeCache, filter_clauses, tree_filters, visible_clauses
+from jobs import JobRunner
+import metrics
+from wire import (
+    FastJSONProvider, compress_response, encode_rows, json_array_chunks, wants_columnar
+)
 
 app = Flask(__name__)
 app.secret_key = "replace-with-a-secure-random-key"
+# orjson-backed jsonify when available; compression for large responses
+app.json = FastJSONProvider(app)
 
 BASE_DIR     = os.path.dirname(__file__)
 UPLOAD_FOLDER= os.path.join(BASE_DIR, "uploads")
-DATA_FOLDER  = os.path.join(BASE_DIR, "data")
+# AFH_DATA_FOLDER moves the database, trees, job state and metrics
+# elsewhere, e.g. for bench.py
+DATA_FOLDER  = os.environ.get("AFH_DATA_FOLDER") or os.path.join(BASE_DIR, "data")
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(DATA_FOLDER, exist_ok=True)
 
+# Requests slower than this many milliseconds are logged (0 = off)
+app.config["SLOW_REQUEST_MS"] = float(os.environ.get("AFH_SLOW_REQUEST_MS", "0"))
+# Filtered trees (see AIRCRAFT_FILTERS) each worker keeps in memory
+app.config["FILTERED_TREE_CACHE"] = int(os.environ.get("AFH_FILTERED_TREE_CACHE", "32"))
+
+# Per-process metrics are merged through data/metrics for /metrics
+metrics.REGISTRY.configure(os.path.join(DATA_FOLDER, "metrics"))
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+    metrics.begin_request()
+
+def _counted(chunks, size):
+    for chunk in chunks:
+        size[0] += len(chunk)
+        yield chunk
+
+# Registered before compress, so it runs after it and sees the bytes sent
+@app.after_request
+def record_request(response):
+    """
+    Record latency, status and body size once the response, streamed or
+    not, has been fully sent; log it if slower than SLOW_REQUEST_MS.
+    """
+    start = g.get("request_start")
+    if start is None:
+        return response
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    method, path, status = request.method, request.full_path.rstrip("?"), response.status_code
+    size = [0]
+    if response.is_streamed:
+        response.response = _counted(response.response, size)
+    else:
+        size[0] = response.content_length or 0
+    slow_ms = app.config["SLOW_REQUEST_MS"]
+
+    def finished():
+        elapsed = time.perf_counter() - start
+        metrics.REQUEST_SECONDS.observe(elapsed, method=method, route=route, status=status)
+        metrics.RESPONSE_BYTES.observe(size[0], route=route)
+        if slow_ms and elapsed * 1000 >= slow_ms:
+            sql_s, sql_n = metrics.request_sql()
+            print(f"Slow request: {method} {path} {status} {elapsed * 1000:.1f} ms, "
+                  f"{sql_n} SQL statements {sql_s * 1000:.1f} ms, {size[0]} bytes")
+        metrics.REGISTRY.maybe_dump()
+    response.call_on_close(finished)
+    return response
+
+@app.after_request
+def compress(response):
+    return compress_response(request, response)
+
+# Shared read-only connections for every API route
+read_pool = ReadConnectionPool(os.path.join(DATA_FOLDER, "data.db"))
+
+# Serialized tree kept in memory until build_json writes a new file, plus
+# the flat form: compact JSON for the browser, mmapped binary for the server
+TREE_JSON = os.path.join(DATA_FOLDER, "full_org_tree.json")
+FLAT_JSON, FLAT_BIN = flat_paths(TREE_JSON)
+tree_snapshot = TreeSnapshot(TREE_JSON)
+flat_snapshot = TreeSnapshot(FLAT_JSON)
+flat_tree = FlatTreeSnapshot(FLAT_BIN)
+# Trees pruned to the aircraft matching a filter, cut from flat_tree on demand
+filtered_trees = FilteredTreeCache(app.config["FILTERED_TREE_CACHE"])
+
+# Uploads and builds run here; all of them write data.db, so they share
+# the "data.db" resource and are serialized against each other. Job state
+# and locks live under data/jobs so every server worker process sees them.
+job_runner = JobRunner(
+    workers=2,
+    state_dir=os.path.join(DATA_FOLDER, "jobs"),
+    on_finish=metrics.observe_job,
+)
+DB_RESOURCE = "data.db"
+
+def preload_shared_state():
+    """
+    Load the tree snapshot and read the hierarchy index, rollups and unit
+    links into the page cache. serve.py calls this in the parent process
+    before forking workers, so they start warm and share those pages.
+    Opens no pooled connections, which must never cross a fork.
+    """
+    try:
+        snap = tree_snapshot.current()
+        flat_snapshot.current()
+        flat = flat_tree.current()
+        # Touch every page of the mapping so workers inherit it resident
+        flat.parent.sum(), flat.end.sum(), flat.by_pas.sum()
+        print(f"Preloaded tree snapshot {snap.etag} ({len(flat)} nodes)")
+    except FileNotFoundError:
+        print("No tree built yet; nothing to preload")
+    db_path = os.path.join(DATA_FOLDER, "data.db")
+    if os.path.exists(db_path):
+        rows = warm_tables(db_path, [HIERARCHY_TABLE, ROLLUP_TABLE, "aircraft_unit_link"])
+        print(f"Preloaded {rows} hierarchy, rollup and link rows")
+
+AIRCRAFT_COLUMNS = """
+    aircraft_serial_number,
+    aircraft_tail_number,
+    mission_design_series,
+    current_assigned_base,
+    active_inventory,
+    current_condition_detail,
+    assigned_unit_pas,
+    flights,
+    landings,
+    flight_time_mins
+"""
+
 @app.route("/")
 def index():
-    return render_template("index.html")
+    return render_template("index.html", jobs=job_runner.recent())
+
+def _load_org_job(path, db_path, progress):
+    try:
+        rows = load_csv_to_sqlite(path, db_file=db_path, table_name="organization", progress=progress)
+    finally:
+        os.remove(path)
+    return f"Org CSV loaded into database ({rows} rows)", {"rows": rows}
+
+def _load_aircraft_job(upload_path, db_path, progress):
+    # Swap the upload into place only once no build is reading the old file
+    path = os.path.join(DATA_FOLDER, "aircraft_filtered.csv")
+    os.replace(upload_path, path)
+    changes = load_aircraft_csv_to_sqlite(path, db_file=db_path, table_name="aircraft", progress=progress)
+    # Keep the readiness rollups current for just the touched branches
+    progress("rollups")
+    refresh_rollups(db_path, changes["affected_pas"], full=changes["mode"] == "full")
+    # and record today's counts for the trend charts
+    progress("history")
+    record_history(db_path)
+    message = (
+        f"Aircraft CSV loaded into database: {len(changes['inserted'])} new, "
+        f"{len(changes['updated'])} changed, {len(changes['retired'])} retired"
+    )
+    summary = {
+        "mode": changes["mode"],
+        "inserted": len(changes["inserted"]),
+        "updated": len(changes["updated"]),
+        "retired": len(changes["retired"]),
+        "affected_pas": len(changes["affected_pas"]),
+    }
+    return message, summary
+
+def _build_json_job(db_path, json_path, progress):
+    build_full_org_tree(
+        db_file=db_path,
+        table_name="organization",
+        output_file=json_path,
+        progress=progress
+    )
+    return "Org tree JSON built", None
 
 @app.route("/upload_csv", methods=["POST"])
 def upload_csv():
@@ -30,14 +199,12 @@ def upload_csv():
     if not file or not file.filename:
         flash("No CSV file selected", "error")
         return redirect(url_for("index"))
-    path = os.path.join(UPLOAD_FOLDER, file.filename)
+    # Unique name: a queued job may not have read an earlier upload yet
+    path = os.path.join(UPLOAD_FOLDER, f"org-{uuid.uuid4().hex}.csv")
     file.save(path)
     db_path = os.path.join(DATA_FOLDER, "data.db")
-    try:
-        load_csv_to_sqlite(path, db_file=db_path, table_name="organization")
-        flash("Org CSV loaded into database", "success")
-    except Exception as e:
-        flash(f"Error loading org CSV: {e}", "error")
+    job = job_runner.submit("upload_csv", _load_org_job, path, db_path, resources=(DB_RESOURCE,))
+    flash(f"Org CSV queued for loading (job {job.id})", "success")
     return redirect(url_for("index"))
 
 @app.route("/upload_aircraft", methods=["POST"])
@@ -46,14 +213,11 @@ def upload_aircraft():
     if not file or not file.filename:
         flash("No aircraft CSV selected", "error")
         return redirect(url_for("index"))
-    path = os.path.join(DATA_FOLDER, "aircraft_filtered.csv")
+    path = os.path.join(UPLOAD_FOLDER, f"aircraft-{uuid.uuid4().hex}.csv")
     file.save(path)
     db_path = os.path.join(DATA_FOLDER, "data.db")
-    try:
-        load_aircraft_csv_to_sqlite(path, db_file=db_path, table_name="aircraft")
-        flash("Aircraft CSV loaded into database", "success")
-    except Exception as e:
-        flash(f"Error loading aircraft CSV: {e}", "error")
+    job = job_runner.submit("upload_aircraft", _load_aircraft_job, path, db_path, resources=(DB_RESOURCE,))
+    flash(f"Aircraft CSV queued for loading (job {job.id})", "success")
     return redirect(url_for("index"))
 
 @app.route("/build_json", methods=["POST"])
@@ -63,30 +227,340 @@ def build_json():
     if not os.path.exists(db_path):
         flash("Database not found. Upload org CSV first.", "error")
         return redirect(url_for("index"))
-    try:
-        build_full_org_tree(
-            db_file=db_path,
-            table_name="organization",
-            output_file=json_path
-        )
-        flash("Org tree JSON built", "success")
-    except Exception as e:
-        flash(f"Error building JSON: {e}", "error")
+    job = job_runner.submit("build_json", _build_json_job, db_path, json_path, resources=(DB_RESOURCE,))
+    flash(f"Org tree build queued (job {job.id})", "success")
     return redirect(url_for("index"))
 
+@app.route("/api/jobs")
+def api_jobs():
+    return jsonify([j.to_dict() for j in job_runner.recent()])
+
+@app.route("/api/jobs/<job_id>")
+def api_job(job_id):
+    job = job_runner.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job '{job_id}'"}), 404
+    return jsonify(job.to_dict())
+
+@app.route("/healthz")
+def healthz():
+    """
+    Liveness and readiness for load balancers: 200 when the database
+    answers, 503 otherwise. Reports the tree ETag this worker is serving.
+    """
+    health = {"status": "ok", "pid": os.getpid(), "database": False, "tree": None}
+    try:
+        with read_pool.connection() as conn:
+            conn.execute("SELECT 1").fetchone()
+        health["database"] = True
+    except sqlite3.Error as e:
+        health["status"] = "unavailable"
+        health["error"] = str(e)
+    try:
+        health["tree"] = tree_snapshot.current().etag
+    except FileNotFoundError:
+        pass
+    health["jobs"] = len(job_runner.active())
+    return jsonify(health), 200 if health["database"] else 503
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """
+    Request, SQL, JSON encoding, tree load and job stage metrics for all
+    server processes, in Prometheus text format.
+    """
+    metrics.REGISTRY.dump()
+    return Response(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
 @app.route("/tree")
 def tree():
     return render_template("tree.html")
 
+def _snapshot_response(current):
+    """
+    Serve the Snapshot returned by current() with a strong ETag so clients
+    revalidate to a 304 until the tree changes. Gzipped bytes are sent
+    when accepted.
+    """
+    try:
+        snap = current()
+    except FileNotFoundError:
+        return jsonify({"error": "Tree not built yet"}), 404
+    except sqlite3.OperationalError as e:
+        return jsonify({"error": f"Aircraft links unavailable, reload aircraft: {e}"}), 503
+
+    use_gzip = "gzip" in request.accept_encodings
+    # Each encoding is a different representation, so it needs its own ETag
+    etag = snap.etag + "-gz" if use_gzip else snap.etag
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        resp = Response(snap.gzip_body if use_gzip else snap.body, mimetype="application/json")
+        if use_gzip:
+            resp.headers["Content-Encoding"] = "gzip"
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.vary.add("Accept-Encoding")
+    return resp
+
+def _tree_response(snapshot, nested):
+    """
+    The built tree file, or with AIRCRAFT_FILTERS parameters the tree
+    pruned to units holding matching aircraft, from the filtered tree cache.
+    """
+    filters = tree_filters(request.args)
+    if not filters:
+        return _snapshot_response(snapshot.current)
+
+    def current():
+        flat = flat_tree.current()
+        etag = flat_snapshot.current().etag
+        with read_pool.connection() as conn:
+            return filtered_trees.get(conn, flat, etag, filters, nested)
+    return _snapshot_response(current)
+
 @app.route("/data/tree.json")
 def data_tree():
-    json_path = os.path.join(DATA_FOLDER, "full_org_tree.json")
-    with open(json_path, encoding="utf-8") as f:
-        data = json.load(f)
-    return jsonify(data)
+    """
+    The nested pruned tree; see _tree_response for filtering.
+    """
+    return _tree_response(tree_snapshot, nested=True)
+
+@app.route("/data/tree_flat.json")
+def data_tree_flat():
+    """
+    The pruned tree as flat pre-order arrays (pas, label, parent, end);
+    see flat_tree.py for the layout and _tree_response for filtering.
+    """
+    return _tree_response(flat_snapshot, nested=False)
+
+# One tree level: each node with its child count and whether its subtree
+# holds any aircraft, so the front end can draw expanders before fetching.
+TREE_LEVEL_SQL = f"""
+    SELECT
+      h.pas,
+      h.label,
+      (SELECT COUNT(*) FROM {HIERARCHY_TABLE} c WHERE c.parent_pas = h.pas),
+      COALESCE(r.total, 0) > 0
+    FROM {HIERARCHY_TABLE} h
+    LEFT JOIN {ROLLUP_TABLE} r ON r.pas = h.pas
+"""
+
+def _tree_level_rows(conn, where, params):
+    cur = conn.execute(f"{TREE_LEVEL_SQL} WHERE {where} ORDER BY h.lft", params)
+    return [
+        {"PAS": pas, "label": label, "child_count": n, "has_aircraft": bool(has)}
+        for pas, label, n, has in cur.fetchall()
+    ]
+
+@app.route("/api/tree/root")
+def api_tree_root():
+    """
+    The root node of the pruned tree, without its descendants.
+    """
+    try:
+        with read_pool.connection() as conn:
+            rows = _tree_level_rows(conn, "h.lft = 0", ())
+    except sqlite3.OperationalError as e:
+        return jsonify({"error": f"Hierarchy index unavailable, rebuild JSON: {e}"}), 503
+    if not rows:
+        return jsonify({"error": "Tree not built yet"}), 404
+    return jsonify(rows[0])
+
+@app.route("/api/tree/children/<pas>")
+def api_tree_children(pas):
+    """
+    The direct children of <pas>, in tree order.
+    """
+    try:
+        with read_pool.connection() as conn:
+            rows = _tree_level_rows(conn, "h.parent_pas = ?", (pas.strip(),))
+    except sqlite3.OperationalError as e:
+        return jsonify({"error": f"Hierarchy index unavailable, rebuild JSON: {e}"}), 503
+    return jsonify(rows)
+
+DEFAULT_SEARCH_HITS = 20
+MAX_SEARCH_HITS     = 100
+
+def _unit_path(conn, flat, pas):
+    """
+    [{"PAS", "label"}, ...] from the root down to <pas>: walked in the
+    mmapped flat tree, or read from the hierarchy index if it lacks <pas>.
+    """
+    i = flat.find(pas) if flat is not None else -1
+    if i >= 0:
+        return [{"PAS": flat.pas(a), "label": flat.label(a)} for a in flat.ancestors(i)]
+    return [{"PAS": p, "label": label} for p, label in ancestor_path(conn, pas)]
+
+@app.route("/api/search")
+def api_search():
+    """
+    Units whose PAS, organization number, unit or grouped name has words
+    starting with every word of q, best first, each with its path from the
+    root so the tree can expand straight to it.
+    """
+    q = request.args.get("q", "").strip()
+    try:
+        limit = min(max(int(request.args.get("limit", DEFAULT_SEARCH_HITS)), 1), MAX_SEARCH_HITS)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    if not q:
+        return jsonify({"q": q, "hits": []})
+    try:
+        flat = flat_tree.current()
+    except (FileNotFoundError, ValueError):
+        flat = None
+    try:
+        with read_pool.connection() as conn:
+            hits = [
+                {
+                    "PAS": pas,
+                    "label": label,
+                    "organization_no": org_no,
+                    "unit": unit,
+                    "grouped": grouped,
+                    "depth": depth,
+                    "path": _unit_path(conn, flat, pas),
+                }
+                for pas, org_no, unit, grouped, label, depth in search_units(conn, q, limit)
+            ]
+    except sqlite3.OperationalError as e:
+        return jsonify({"error": f"Search index unavailable, rebuild JSON: {e}"}), 503
+    return jsonify({"q": q, "hits": hits})
+
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE     = 2000
+
+def _aircraft_response(joins, scope_where, scope_params, rollup_pas=None):
+    """
+    Rows for a scope (joins + WHERE clauses). Without paging parameters the
+    response is the plain list of rows. With limit, after or facets it is a
+    page: the AIRCRAFT_FILTERS dropdowns applied in SQL, transient and stored
+    aircraft hidden, rows keyset-paginated on aircraft_serial_number, plus
+    status summary and per-dropdown facet counts.
+
+    The summary comes with the first page only (no after). For a subtree
+    scope (rollup_pas) without filters it is that node's precomputed rollup.
+
+    Rows are sent column-oriented and dictionary-encoded when the client
+    asks for it (format=columnar or the columnar Accept type).
+    """
+    args = request.args
+    paged = any(k in args for k in ("limit", "after", "facets"))
+    columnar = wants_columnar(request)
+    if not paged:
+        sql = f"""
+          SELECT {AIRCRAFT_COLUMNS}
+          FROM aircraft
+          {joins}
+          WHERE {" AND ".join(scope_where)}
+        """
+        # The connection stays borrowed until the streamed body is finished
+        stack = ExitStack()
+        conn = stack.enter_context(read_pool.connection())
+        try:
+            cur = conn.execute(sql, scope_params)
+            cols = [c[0] for c in cur.description]
+        except Exception:
+            stack.close()
+            raise
+        if columnar:
+            # Dictionary encoding needs every row, so this is not streamed
+            with stack:
+                return jsonify(encode_rows(cols, cur.fetchall(), columnar=True))
+
+        def generate():
+            with stack:
+                yield from json_array_chunks(cols, cur)
+        return Response(generate(), mimetype="application/json")
+
+    with read_pool.connection() as conn:
+
+        try:
+            limit = min(max(int(args.get("limit", DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            return jsonify({"error": "limit must be an integer"}), 400
+        base_where = scope_where + visible_clauses(conn)
+        filter_where, filter_params = filter_clauses(args)
+        where = base_where + filter_where
+        params = scope_params + filter_params
+
+        page_where, page_params = list(where), list(params)
+        after = args.get("after", "")
+        if after:
+            page_where.append("aircraft.aircraft_serial_number > ?")
+            page_params.append(after)
+        cur = conn.execute(f"""
+          SELECT {AIRCRAFT_COLUMNS}
+          FROM aircraft
+          {joins}
+          WHERE {" AND ".join(page_where)}
+          ORDER BY aircraft.aircraft_serial_number
+          LIMIT ?
+        """, page_params + [limit + 1])
+        cols = [c[0] for c in cur.description]
+        rows = cur.fetchall()
+        next_after = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_after = rows[-1][cols.index("aircraft_serial_number")]
+
+        summary = None
+        if not after and rollup_pas and not filter_where:
+            try:
+                summary = get_rollup(conn, rollup_pas)
+            except sqlite3.OperationalError:
+                summary = None
+            if summary is not None:
+                summary = {k: summary[k] for k in ("total", "status", "nmc", "mc_rate")}
+        if not after and summary is None:
+            total, fmc, pmc, nmc, nmcm, nmcs, nmcb = conn.execute(f"""
+              SELECT {STATS_COUNTS}
+              FROM aircraft
+              {joins}
+              WHERE {" AND ".join(where)}
+            """, params).fetchone()
+            summary = {
+                "total": total,
+                "status": {"FMC": fmc, "PMC": pmc, "NMC": nmc},
+                "nmc": {"NMCM": nmcm, "NMCS": nmcs, "NMCB": nmcb},
+                "mc_rate": round((fmc + pmc) / total * 100, 1) if total else 0.0,
+            }
+
+        facets = {}
+        if args.get("facets") == "1":
+            # Each dropdown counts rows matching every other active filter
+            for param, col in AIRCRAFT_FILTERS.items():
+                f_where, f_params = filter_clauses(args, skip=param)
+                cur = conn.execute(f"""
+                  SELECT aircraft.{col}, COUNT(*)
+                  FROM aircraft
+                  {joins}
+                  WHERE {" AND ".join(base_where + f_where)}
+                    AND aircraft.{col} IS NOT NULL AND aircraft.{col} != ''
+                  GROUP BY aircraft.{col}
+                  ORDER BY aircraft.{col}
+                """, scope_params + f_params)
+                facets[param] = [{"value": v, "count": n} for v, n in cur.fetchall()]
+
+    return jsonify({
+        "rows": encode_rows(cols, rows, columnar),
+        "next_after": next_after,
+        "summary": summary,
+        "facets": facets,
+    })
 
 @app.route("/api/aircraft")
 def api_aircraft():
+    """
+    Aircraft for a scope: subtree=<pas> resolves descendants server-side,
+    otherwise a single pas or a JSON pas_list of exact PAS codes.
+    See _aircraft_response for filtering and paging parameters.
+    """
+    subtree = request.args.get("subtree", "").strip()
+    if subtree:
+        return api_subtree_aircraft(subtree)
+
     # Accept either pas_list or single pas
     pas_list = []
     if 'pas_list' in request.args:
@@ -102,50 +576,171 @@ def api_aircraft():
     if not pas_list:
         return jsonify([])
 
-    db_path = os.path.join(DATA_FOLDER, "data.db")
-    conn = sqlite3.connect(db_path)
     placeholders = ",".join("?" for _ in pas_list)
-    sql = f"""
-      SELECT
-        aircraft_serial_number,
-        aircraft_tail_number,
-        mission_design_series,
-        current_assigned_base,
-        active_inventory,
-        current_condition_detail,
-        assigned_unit_pas,
-        flights,
-        landings,
-        flight_time_mins
-      FROM aircraft
-      WHERE assigned_unit_pas IN ({placeholders})
+    try:
+        return _aircraft_response("", [f"aircraft.assigned_unit_pas IN ({placeholders})"], list(pas_list))
+    except sqlite3.OperationalError as e:
+        # e.g. a database loaded before the normalized status columns
+        return jsonify({"error": f"Statistics unavailable, reload data: {e}"}), 503
+
+@app.route("/api/subtree/<pas>/aircraft")
+def api_subtree_aircraft(pas):
     """
-    cur = conn.execute(sql, pas_list)
-    cols = [c[0] for c in cur.description]
-    rows = [dict(zip(cols, row)) for row in cur.fetchall()]
-    conn.close()
-    return jsonify(rows)
+    Aircraft assigned anywhere under <pas>, with descendants resolved
+    server-side from the hierarchy index written by build_json.
+    """
+    try:
+        return _aircraft_response(
+            SUBTREE_JOIN, ["aircraft.assigned_unit_pas = sub.pas"], [pas.strip()], rollup_pas=pas.strip()
+        )
+    except sqlite3.OperationalError as e:
+        return jsonify({"error": f"Hierarchy index unavailable, rebuild JSON: {e}"}), 503
+
+@app.route("/api/rollup/<pas>")
+def api_rollup(pas):
+    """
+    Precomputed subtree status counts and mission capable rate for <pas>.
+    """
+    try:
+        with read_pool.connection() as conn:
+            rollup = get_rollup(conn, pas.strip())
+    except sqlite3.OperationalError as e:
+        return jsonify({"error": f"Rollups unavailable, rebuild JSON: {e}"}), 503
+    if rollup is None:
+        return jsonify({"error": f"Unknown PAS '{pas}'"}), 404
+    return jsonify(rollup)
+
+DEFAULT_TREND_DAYS = 365
+
+@app.route("/api/trend/<pas>")
+def api_trend(pas):
+    """
+    Readiness history of the subtree under <pas>: one point per day with a
+    recorded snapshot, between from and to (YYYY-MM-DD, inclusive; by
+    default the last DEFAULT_TREND_DAYS days).
+    """
+    try:
+        end = datetime.date.fromisoformat(request.args.get("to") or datetime.date.today().isoformat())
+        start = request.args.get("from")
+        start = datetime.date.fromisoformat(start) if start else end - datetime.timedelta(days=DEFAULT_TREND_DAYS)
+    except ValueError:
+        return jsonify({"error": "from and to must be YYYY-MM-DD dates"}), 400
+    pas = pas.strip()
+    try:
+        with read_pool.connection() as conn:
+            points = get_trend(conn, pas, start.isoformat(), end.isoformat())
+            if not any(p["total"] for p in points) and get_rollup(conn, pas) is None:
+                return jsonify({"error": f"Unknown PAS '{pas}'"}), 404
+    except sqlite3.OperationalError as e:
+        return jsonify({"error": f"Trend history unavailable, load aircraft: {e}"}), 503
+    return jsonify({"pas": pas, "from": start.isoformat(), "to": end.isoformat(), "points": points})
 
 @app.route("/api/fmc_stats")
 def api_fmc_stats():
-    db_path = os.path.join(DATA_FOLDER, "data.db")
-    conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT COUNT(*) FROM aircraft
-        WHERE UPPER(active_inventory) = 'Y'
-          AND UPPER(current_condition_detail) = 'FMC'
-    """)
-    fmc_count = cur.fetchone()[0]
-    cur.execute("""
-        SELECT COUNT(*) FROM aircraft
-        WHERE UPPER(active_inventory) = 'Y'
-          AND UPPER(current_condition_detail) != 'FMC'
-    """)
-    non_fmc_count = cur.fetchone()[0]
-    conn.close()
+    try:
+        with read_pool.connection() as conn:
+            cols = {r[1] for r in conn.execute("PRAGMA table_info(aircraft)")}
+            if {"status_prefix", "active_flag"} <= cols:
+                # One pass over the (status_prefix, nmc_subtype, active_flag) index
+                sql = """
+                    SELECT
+                      COALESCE(SUM(status_prefix = 'FMC'), 0),
+                      COALESCE(SUM(status_prefix != 'FMC'), 0)
+                    FROM aircraft
+                    WHERE active_flag = 1
+                """
+            else:
+                # Loaded before the normalized columns existed: raw columns
+                sql = """
+                    SELECT
+                      COALESCE(SUM(UPPER(current_condition_detail) = 'FMC'), 0),
+                      COALESCE(SUM(UPPER(current_condition_detail) != 'FMC'), 0)
+                    FROM aircraft
+                    WHERE UPPER(active_inventory) = 'Y'
+                """
+            fmc_count, non_fmc_count = conn.execute(sql).fetchone()
+    except sqlite3.OperationalError as e:
+        return jsonify({"error": f"Statistics unavailable, reload data: {e}"}), 503
     return jsonify({"fmc": fmc_count, "non_fmc": non_fmc_count})
 
+# Grouping keys accepted by /api/stats
+STATS_GROUPS = {
+    "status": "aircraft.status_prefix",
+    "mds":    "aircraft.mission_design_series",
+    "base":   "aircraft.current_assigned_base",
+}
+
+STATS_COUNTS = """
+    COUNT(*),
+    COALESCE(SUM(aircraft.status_prefix = 'FMC'), 0),
+    COALESCE(SUM(aircraft.status_prefix = 'PMC'), 0),
+    COALESCE(SUM(aircraft.status_prefix = 'NMC'), 0),
+    COALESCE(SUM(aircraft.nmc_subtype = 'NMCM'), 0),
+    COALESCE(SUM(aircraft.nmc_subtype = 'NMCS'), 0),
+    COALESCE(SUM(aircraft.nmc_subtype = 'NMCB'), 0)
+"""
+
+@app.route("/api/stats")
+def api_stats():
+    """
+    Status counts grouped by status, mds, base or subtree in one GROUP BY.
+
+    Query parameters:
+      by      status (default), mds, base, or subtree (one row per direct
+              child of pas, each counting its whole subtree)
+      pas     restrict to the subtree under this PAS (required for subtree)
+      active  1 to count only active inventory
+    """
+    by     = request.args.get("by", "status")
+    pas    = request.args.get("pas", "").strip()
+    active = request.args.get("active") == "1"
+
+    joins, where, params = "", [], []
+    if by == "subtree":
+        if not pas:
+            return jsonify({"error": "by=subtree requires pas"}), 400
+        key = "grp.pas"
+        joins = f"""
+          JOIN {HIERARCHY_TABLE} grp ON grp.parent_pas = ?
+          JOIN {HIERARCHY_TABLE} sub ON sub.lft BETWEEN grp.lft AND grp.rgt
+        """
+        params.append(pas)
+        where.append("aircraft.assigned_unit_pas = sub.pas")
+    elif by in STATS_GROUPS:
+        key = STATS_GROUPS[by]
+        if pas:
+            joins = SUBTREE_JOIN
+            params.append(pas)
+            where.append("aircraft.assigned_unit_pas = sub.pas")
+    else:
+        return jsonify({"error": f"Unknown grouping '{by}'"}), 400
+    if active:
+        where.append("aircraft.active_flag = 1")
+
+    sql = f"""
+      SELECT {key}, {STATS_COUNTS}
+      FROM aircraft
+      {joins}
+      {"WHERE " + " AND ".join(where) if where else ""}
+      GROUP BY {key}
+      ORDER BY {key}
+    """
+    try:
+        with read_pool.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+    except sqlite3.OperationalError as e:
+        return jsonify({"error": f"Statistics unavailable, reload data: {e}"}), 503
+
+    groups = []
+    for k, total, fmc, pmc, nmc, nmcm, nmcs, nmcb in rows:
+        groups.append({
+            "key": k,
+            "total": total,
+            "status": {"FMC": fmc, "PMC": pmc, "NMC": nmc},
+            "nmc": {"NMCM": nmcm, "NMCS": nmcs, "NMCB": nmcb},
+        })
+    return jsonify({"by": by, "pas": pas or None, "groups": groups})
+
 if __name__ == "__main__":
     if len(sys.argv) > 1 and sys.argv[1] == "--open":
         webbrowser.open("http://127.0.0.1:5000")
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Benchmark the AFHierarchy pipeline on synthetic data.
+
+    python bench.py --units 20000 --depth 8 --fanout 6 --aircraft 100000 \
+                    --concurrency 1,8,32 --requests 2000
+
+Generates an org CSV rooted at FHCC and a matching aircraft CSV, times
+ingest (full and incremental), every build_json stage, then measures
+p50/p95/p99 latency of the API routes under concurrent load through the
+Flask test client. Results are written as JSON (--out) so runs on
+different commits or machines can be compared.
+"""
+import os
+import csv
+import sys
+import json
+import time
+import random
+import sqlite3
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from db import load_csv_to_sqlite, load_aircraft_csv_to_sqlite
+from build_full_org_tree import build_full_org_tree, ROOT_PAS
+from hierarchy import HIERARCHY_TABLE
+from rollup import refresh_rollups
+
+ORG_COLUMNS = ["pas", "parent_pas", "organization_no", "unit", "organization_name"]
+AIRCRAFT_COLUMNS = [
+    "aircraft_serial_number", "aircraft_tail_number", "mission_design_series",
+    "current_assigned_base", "location", "active_inventory", "current_condition_detail",
+    "assigned_unit_pas", "assigned_unit_hierarchy", "flights", "landings", "flight_time_mins",
+]
+MDS      = ["F-16C", "F-15E", "A-10C", "C-17A", "C-130J", "KC-135R", "KC-46A", "B-52H", "HH-60W", "T-38C"]
+BASES    = ["HILL", "DOVER", "MACDILL", "LANGLEY", "NELLIS", "TRAVIS", "BARKSDALE", "KADENA", "RAMSTEIN", "ELMENDORF"]
+STATUSES = ["FMC"] * 6 + ["PMCM", "PMCS", "NMCM", "NMCM", "NMCS", "NMCB", "TRAN"]
+UNIT_NAMES = ["Wing", "Group", "Squadron", "Flight", "Detachment"]
+
+def generate_org_csv(path, units=5000, depth=6, fanout=5, root_pas=ROOT_PAS, masked=0.01, seed=0):
+    """
+    Write an org CSV of up to <units> rows: root_pas first, then nodes added
+    breadth-first with 1..fanout children each, no deeper than depth. About
+    <masked> of the rows are "Data Masked", and a few names match the
+    grouping rules. Returns ({pas: parent_pas} for the unmasked nodes, number
+    of rows written).
+    """
+    rng = random.Random(seed)
+    parents = {root_pas: "FBS4"}
+    rows = [(root_pas, "FBS4", "0000", "U S AIR FORCE HEADQUARTERS", "U S Air Force Headquarters")]
+    level = [root_pas]
+    n = 1
+    for d in range(1, depth + 1):
+        next_level = []
+        for parent in level:
+            for _ in range(rng.randint(1, fanout)):
+                if n >= units:
+                    break
+                pas = f"P{n:07d}"
+                unit = f"{n} {UNIT_NAMES[min(d, len(UNIT_NAMES)) - 1].upper()}"
+                if rng.random() < masked:
+                    name = "Data Masked"
+                else:
+                    name = "Department of Defense" if n % 97 == 0 else unit.title()
+                    parents[pas] = parent
+                    next_level.append(pas)
+                rows.append((pas, parent, f"{n:06d}", unit, name))
+                n += 1
+        level = next_level
+        if not level or n >= units:
+            break
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(ORG_COLUMNS)
+        w.writerows(rows)
+    return parents, len(rows)
+
+def _ancestry(pas, parents, cache):
+    if pas not in cache:
+        parent = parents.get(pas)
+        cache[pas] = (_ancestry(parent, parents, cache) if parent in parents else []) + [pas]
+    return cache[pas]
+
+def generate_aircraft_csv(path, parents, count=20000, seed=0, changed=0.0, base_rows=None):
+    """
+    Write <count> aircraft assigned to random non-root units, with the
+    unit's ancestry as assigned_unit_hierarchy. With base_rows (the list
+    returned by an earlier call) and changed > 0, re-emit those rows with a
+    <changed> fraction given a new status instead. Returns the rows.
+    """
+    rng = random.Random(seed)
+    if base_rows is not None:
+        rows = [list(r) for r in base_rows]
+        for r in rng.sample(rows, int(len(rows) * changed)):
+            r[6] = rng.choice(STATUSES)
+    else:
+        units = sorted(p for p in parents if p != ROOT_PAS) or [ROOT_PAS]
+        cache = {}
+        rows = []
+        for i in range(count):
+            pas = rng.choice(units)
+            rows.append([
+                f"SN{i:08d}", f"T{i}", rng.choice(MDS), rng.choice(BASES),
+                "in storage" if rng.random() < 0.02 else "",
+                rng.choice("YYYYN"), rng.choice(STATUSES), pas,
+                "[" + ", ".join(_ancestry(pas, parents, cache)) + "]",
+                rng.randint(0, 500), rng.randint(0, 500), rng.randint(0, 90000),
+            ])
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(AIRCRAFT_COLUMNS)
+        w.writerows(rows)
+    return rows
+
+class StageTimer:
+    """
+    Progress callback recording how long each reported stage ran.
+    """
+    def __init__(self):
+        self.stages = {}
+        self._stage = None
+        self._start = None
+
+    def __call__(self, stage, rows=None):
+        self._close()
+        self._stage, self._start = stage, time.perf_counter()
+
+    def _close(self):
+        if self._stage is not None:
+            self.stages[self._stage] = self.stages.get(self._stage, 0.0) + time.perf_counter() - self._start
+            self._stage = None
+
+    def finish(self):
+        self._close()
+        return {k: round(v, 4) for k, v in self.stages.items()}
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, round(time.perf_counter() - start, 4)
+
+def _latency_summary(samples):
+    ms = np.array(samples) * 1000
+    return {
+        "count": len(ms),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+def api_targets(db_file, rng, sample=50):
+    """
+    (route name, URL) pairs covering the tree, rollup, stats and aircraft
+    endpoints, spread over PAS codes from every depth of the built tree.
+    """
+    conn = sqlite3.connect(db_file)
+    try:
+        nodes = conn.execute(f"SELECT pas, depth, rgt - lft FROM {HIERARCHY_TABLE}").fetchall()
+    finally:
+        conn.close()
+    inner = [p for p, _, size in nodes if size > 0] or [ROOT_PAS]
+    chosen = rng.sample([p for p, _, _ in nodes], min(sample, len(nodes)))
+    targets = [("tree.json", "/data/tree.json"), ("tree_root", "/api/tree/root"), ("fmc_stats", "/api/fmc_stats")]
+    for pas in chosen:
+        targets += [
+            ("rollup", f"/api/rollup/{pas}"),
+            ("aircraft_pas", f"/api/aircraft?pas={pas}"),
+            ("subtree_page", f"/api/subtree/{pas}/aircraft?limit=200&facets=1&format=columnar"),
+        ]
+    for pas in rng.sample(inner, min(sample, len(inner))):
+        targets += [
+            ("tree_children", f"/api/tree/children/{pas}"),
+            ("stats_subtree", f"/api/stats?by=subtree&pas={pas}"),
+        ]
+    targets.append(("stats_status", "/api/stats?by=status"))
+    return targets
+
+def run_api_load(flask_app, targets, concurrency, requests, seed=0):
+    """
+    Issue <requests> GETs across <concurrency> threads, each with its own
+    test client, picking a route uniformly and then one of its URLs.
+    Returns per-route latency summaries.
+    """
+    rng = random.Random(seed)
+    by_route = defaultdict(list)
+    for name, url in targets:
+        by_route[name].append(url)
+    names = sorted(by_route)
+    plan = []
+    for _ in range(requests):
+        name = rng.choice(names)
+        plan.append((name, rng.choice(by_route[name])))
+    lock = threading.Lock()
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    local = threading.local()
+
+    def hit(target):
+        name, url = target
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = flask_app.test_client()
+        start = time.perf_counter()
+        resp = client.get(url, headers={"Accept-Encoding": "gzip"})
+        resp.get_data()
+        elapsed = time.perf_counter() - start
+        resp.close()
+        with lock:
+            latencies[name].append(elapsed)
+            if resp.status_code != 200:
+                errors[name] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(hit, plan))
+    wall = time.perf_counter() - start
+
+    routes = {}
+    for name, samples in sorted(latencies.items()):
+        routes[name] = dict(_latency_summary(samples), errors=errors[name])
+    overall = _latency_summary([s for v in latencies.values() for s in v])
+    overall["requests_per_s"] = round(requests / wall, 1)
+    return {"concurrency": concurrency, "overall": overall, "routes": routes}
+
+def run_benchmark(workdir, units, depth, fanout, aircraft, concurrency, requests, seed=0):
+    results = {
+        "params": {
+            "units": units, "depth": depth, "fanout": fanout, "aircraft": aircraft,
+            "concurrency": concurrency, "requests": requests, "seed": seed,
+        },
+        "env": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    org_csv      = os.path.join(workdir, "org.csv")
+    aircraft_csv = os.path.join(workdir, "aircraft_filtered.csv")
+    db_file      = os.path.join(workdir, "data.db")
+    json_file    = os.path.join(workdir, "full_org_tree.json")
+
+    (parents, org_rows), t_org = timed(generate_org_csv, org_csv, units, depth, fanout, seed=seed)
+    rows, t_ac = timed(generate_aircraft_csv, aircraft_csv, parents, aircraft, seed=seed)
+    results["generate"] = {"org_rows": org_rows, "aircraft_rows": len(rows), "org_s": t_org, "aircraft_s": t_ac}
+
+    ingest = {}
+    _, ingest["org_s"] = timed(load_csv_to_sqlite, org_csv, db_file=db_file)
+    _, ingest["aircraft_full_s"] = timed(load_aircraft_csv_to_sqlite, aircraft_csv, db_file=db_file)
+
+    build_timer = StageTimer()
+    _, total = timed(build_full_org_tree, db_file=db_file, output_file=json_file, progress=build_timer)
+    results["build"] = {"total_s": total, "stages_s": build_timer.finish()}
+
+    # A later day's feed: same fleet, a few percent of statuses changed
+    generate_aircraft_csv(aircraft_csv, parents, seed=seed + 1, changed=0.05, base_rows=rows)
+    changes, ingest["aircraft_incremental_s"] = timed(load_aircraft_csv_to_sqlite, aircraft_csv, db_file=db_file)
+    _, ingest["rollup_refresh_s"] = timed(
+        refresh_rollups, db_file, changes["affected_pas"], full=changes["mode"] == "full")
+    ingest["incremental_updated"] = len(changes["updated"])
+    results["ingest"] = ingest
+
+    # app.py opens its data folder, job state and metrics on import; point
+    # all of them at the workdir so nothing reaches the real data/
+    os.environ["AFH_DATA_FOLDER"] = workdir
+    import app as webapp
+    if os.path.abspath(webapp.DATA_FOLDER) != os.path.abspath(workdir):
+        raise RuntimeError("app was imported before the benchmark set AFH_DATA_FOLDER")
+    targets = api_targets(db_file, random.Random(seed))
+    run_api_load(webapp.app, targets, 1, min(200, requests), seed=seed)  # warm-up
+    results["api"] = [run_api_load(webapp.app, targets, c, requests, seed=seed) for c in concurrency]
+    webapp.read_pool.close_all()
+    return results
+
+def print_summary(results):
+    print(f"\nBuild {results['build']['total_s']}s: {results['build']['stages_s']}")
+    print(f"Ingest: {results['ingest']}")
+    for run in results["api"]:
+        o = run["overall"]
+        print(f"\nconcurrency {run['concurrency']}: {o['requests_per_s']} req/s, "
+              f"p50 {o['p50_ms']}ms p95 {o['p95_ms']}ms p99 {o['p99_ms']}ms")
+        for name, r in run["routes"].items():
+            print(f"  {name:<16} n={r['count']:<6} p50 {r['p50_ms']:>9} p95 {r['p95_ms']:>9} "
+                  f"p99 {r['p99_ms']:>9} errors {r['errors']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingest, build and API latency on synthetic data.")
+    parser.add_argument("--units", type=int, default=5000, help="org rows to generate")
+    parser.add_argument("--depth", type=int, default=6, help="maximum tree depth")
+    parser.add_argument("--fanout", type=int, default=5, help="maximum children per unit")
+    parser.add_argument("--aircraft", type=int, default=20000, help="aircraft rows to generate")
+    parser.add_argument("--concurrency", default="1,8", help="comma-separated thread counts")
+    parser.add_argument("--requests", type=int, default=1000, help="API requests per concurrency level")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="keep generated files here instead of a temp dir")
+    parser.add_argument("--out", help="results JSON path (default bench-<timestamp>.json)")
+    args = parser.parse_args()
+
+    concurrency = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    workdir = args.workdir or tempfile.mkdtemp(prefix="afh-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        results = run_benchmark(workdir, args.units, args.depth, args.fanout, args.aircraft,
+                                concurrency, args.requests, args.seed)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    out = args.out or time.strftime("bench-%Y%m%d-%H%M%S.json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print_summary(results)
+    print(f"\nResults saved to {out}")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,126 +2,182 @@ import sys
 import os
 import sqlite3
 import pandas as pd
-import json
-import re
-
-# 1) Define grouping patterns: regex → group label
-GROUP_PATTERNS = {
-    r'AFELM.*DOD': 'AFELM DOD',
-    r'U S Air Force Headquarters': 'USAF HQ',
-    r'Department of Defense': 'DoD',
-    # Add more patterns here...
-}
-
-def apply_grouping(name):
+from db import no_progress
+from columnar import parquet_path, read_parquet
+from flat_tree import flat_paths, write_flat
+from grouping import compiled_rules
+from hierarchy import write_hierarchy_index
+from rollup import record_history, write_rollups
+from search import write_search_index
+from tree_engine import OrgTree
+
+# Every tree is rooted at U S Air Force Headquarters
+ROOT_PAS = 'FHCC'
+
+ORG_COLUMNS = ["pas", "parent_pas", "organization_no", "unit", "organization_name"]
+
+# 1) Grouping patterns (regex → group label) live in grouping_rules.json;
+#    add more rules there. They are read and checked on first use (see
+#    grouping.compiled_rules), so a bad rule fails the build rather than the
+#    import of this module
+
+def __getattr__(name):
+    # GROUP_PATTERNS (pattern → label) is read from the rules file on access
+    if name == "GROUP_PATTERNS":
+        return dict(compiled_rules().rules)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def apply_grouping(name, rules=None):
     """
     Map an organization_name to a grouped label if it matches any pattern,
-    otherwise return the original name.
+    otherwise return the original name. Rules default to the compiled
+    grouping_rules.json.
     """
-    for pattern, label in GROUP_PATTERNS.items():
-        if re.search(pattern, name, re.IGNORECASE):
-            return label
-    return name
+    return (rules if rules is not None else compiled_rules()).group(name)
 
-def load_valid_pas_set(data_folder="data"):
+def _pas_in_frame(df):
     """
-    Read aircraft_filtered.csv and collect all PAS codes that appear
-    in assigned_unit_pas or in assigned_unit_hierarchy lists.
+    Every PAS in an aircraft frame's assigned_unit_pas column or in its
+    assigned_unit_hierarchy "[A, B, C]" lists.
     """
+    values = []
+    if "assigned_unit_pas" in df.columns:
+        values.append(pd.Series(df["assigned_unit_pas"].dropna().unique()).astype(str).str.strip())
+    if "assigned_unit_hierarchy" in df.columns:
+        # Aircraft of one unit share a hierarchy string; split each once
+        listed = (
+            pd.Series(df["assigned_unit_hierarchy"].dropna().unique()).astype(str)
+            .str.strip().str.strip("[]").str.split(",")
+            .explode().dropna().str.strip()
+        )
+        values.append(listed)
+    if not values:
+        return set()
+    found = set(pd.concat(values).unique())
+    found.discard("")
+    return found
+
+def load_valid_pas_set(data_folder="data", db_file=None):
+    """
+    Collect all PAS codes that appear in assigned_unit_pas or in
+    assigned_unit_hierarchy lists. Read from the aircraft_unit_link table
+    when the database has one, else just those two columns from the
+    aircraft Parquet copy, else from aircraft_filtered.csv.
+    """
+    wanted = ["assigned_unit_pas", "assigned_unit_hierarchy"]
+    if db_file and os.path.exists(db_file):
+        conn = sqlite3.connect(db_file)
+        try:
+            return {r[0] for r in conn.execute("SELECT DISTINCT pas FROM aircraft_unit_link")}
+        except sqlite3.OperationalError:
+            pass
+        finally:
+            conn.close()
+
+        df = read_parquet(parquet_path(db_file, "aircraft"), columns=wanted)
+        if df is not None:
+            return _pas_in_frame(df)
+
     path = os.path.join(data_folder, "aircraft_filtered.csv")
     if not os.path.exists(path):
         return set()
-    df = pd.read_csv(path, low_memory=False)
-    valid = set()
-
-    for _, row in df.iterrows():
-        pas = str(row.get("assigned_unit_pas","")).strip()
-        if pas:
-            valid.add(pas)
-        uh = str(row.get("assigned_unit_hierarchy","")).strip()
-        parts = [p.strip() for p in uh.strip("[]").split(",") if p.strip()]
-        valid.update(parts)
-    return valid
-
-def prune_by_aircraft(node, valid_pas):
+    df = pd.read_csv(path, usecols=lambda c: c in wanted, dtype=str)
+    return _pas_in_frame(df)
+
+def prune_by_aircraft(tree, valid_pas):
     """
-    Recursively prune node if neither its PAS nor any descendant PAS
-    is in valid_pas. Returns True if node should be kept.
+    Return a copy of the tree keeping only nodes whose PAS, or any
+    descendant's PAS, is in valid_pas (the root is always kept).
     """
-    keep_children = []
-    for child in node.get("Children", []):
-        if prune_by_aircraft(child, valid_pas):
-            keep_children.append(child)
-    node["Children"] = keep_children
+    return tree.pruned(valid_pas)
 
-    # Keep this node if its PAS is valid or it has any kept children
-    return (node["PAS"] in valid_pas) or bool(keep_children)
-
-def build_tree_structure(df):
+def build_tree_structure(df, root_pas=ROOT_PAS, rules=None):
     """
-    Build the raw PAS → parent_pas tree, force FR3R as root,
-    and assign each node a label "<organization_no> - <grouped_name>".
+    Build the raw PAS → parent_pas tree as an array-backed OrgTree,
+    force FHCC as root, and assign each node a label
+    "<organization_no> - <unit>". Grouping rules default to
+    grouping_rules.json, re-read if it changed since the last build.
     """
     # Apply grouping to organization_name
-    df['grouped_name'] = df['organization_name'].astype(str).apply(apply_grouping)
-
-    # Build a map pas → node
-    node_map = {}
-    for _, row in df.iterrows():
-        pas           = str(row['pas']).strip()
-        parent_pas    = str(row['parent_pas']).strip() if pd.notnull(row['parent_pas']) else ""
-        org_no        = str(row['organization_no']).strip()
-        org_label     = row['grouped_name']
-        unit          = row['unit']
-        label         = f"{org_no} - {unit}"
-        node_map[pas] = {
-            "PAS": pas,
-            "label": label,
-            "parent_pas": parent_pas,
-            "Children": []
-        }
-
-    # Link children to parents
-    for pas, node in node_map.items():
-        parent = node["parent_pas"]
-        if parent in node_map and pas != 'FHCC':
-            node_map[parent]["Children"].append(node)
-
-    # Force root to be FR3R
-    if 'FHCC' not in node_map:
-        raise KeyError("PAS 'FHCC' not found; cannot set DoD as root.")
-    return node_map['FHCC']
-
-def build_full_org_tree(db_file="data.db", table_name="organization", output_file="full_org_tree.json"):
+    rules = rules if rules is not None else compiled_rules()
+    df = df.assign(grouped_name=rules.group_series(df['organization_name']))
+    return OrgTree.from_frame(df, root_pas)
+
+def search_rows(tree, df):
+    """
+    (pas, organization_no, unit, grouped) for every node kept in the tree,
+    taking each PAS's last org row as the tree itself does.
+    """
+    info = (
+        df.assign(pas=df["pas"].astype(str).fillna("nan").str.strip())
+        .drop_duplicates("pas", keep="last")
+        .set_index("pas")
+    )
+    order, _ = tree.preorder()
+    pas = tree.pas[order]
+    info = info.reindex(pas)
+    org_no = info["organization_no"].astype(str).str.strip().where(info["organization_no"].notna(), "")
+    unit = info["unit"].astype(str).where(info["unit"].notna(), "")
+    return list(zip(pas.tolist(), org_no.tolist(), unit.tolist(), tree.grouped[order].tolist()))
+
+def build_full_org_tree(db_file="data.db", table_name="organization", output_file="full_org_tree.json",
+                        progress=no_progress):
     """
     Load data from SQLite, filter masked rows, build & prune the tree
     based on aircraft assignments, and write the JSON.
+    progress(stage, rows) is called as each build stage starts.
     """
-    # Load org data
-    conn = sqlite3.connect(db_file)
-    df = pd.read_sql_query(f"""
-        SELECT pas, parent_pas, organization_no, unit, organization_name
-        FROM {table_name}
-    """, conn)
-    conn.close()
+    # Load org data, from the Parquet copy when there is one
+    progress("loading org")
+    df = read_parquet(parquet_path(db_file, table_name), columns=ORG_COLUMNS)
+    if df is None or list(df.columns) != ORG_COLUMNS:
+        conn = sqlite3.connect(db_file)
+        df = pd.read_sql_query(f"""
+            SELECT {", ".join(ORG_COLUMNS)}
+            FROM {table_name}
+        """, conn)
+        conn.close()
 
     # Filter out masked rows
     df = df[~df['organization_name'].str.contains("Data Masked", case=False, na=False)]
 
     # Build full tree with new labels
-    root = build_tree_structure(df)
+    progress("building tree", rows=len(df))
+    tree = build_tree_structure(df)
 
     # Load valid PAS set from aircraft data
-    valid_pas = load_valid_pas_set(data_folder=os.path.dirname(db_file))
+    progress("pruning")
+    valid_pas = load_valid_pas_set(data_folder=os.path.dirname(db_file), db_file=db_file)
 
     # Prune nodes without any aircraft
-    prune_by_aircraft(root, valid_pas)
-
-    # Write JSON
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(root, f, indent=2)
+    tree = prune_by_aircraft(tree, valid_pas)
+
+    # Write JSON; swapped into place whole so servers never read a partial file
+    progress("writing json")
+    tmp_file = output_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        f.write(tree.to_json())
+    os.replace(tmp_file, output_file)
     print(f"Pruned & relabeled org tree saved to {output_file}")
 
+    # Same tree as flat arrays: compact JSON for the browser, mmap-able binary
+    flat_json, flat_bin = flat_paths(output_file)
+    write_flat(*tree.flat(), json_path=flat_json, bin_path=flat_bin)
+    print(f"Flat tree snapshots saved to {flat_json} and {flat_bin}")
+
+    # Persist the pruned hierarchy so the server can resolve subtrees
+    progress("indexing")
+    write_hierarchy_index(tree.intervals(), db_file=db_file)
+
+    # Precompute subtree readiness counts for the details pane
+    progress("rollups")
+    write_rollups(db_file=db_file)
+    record_history(db_file)
+
+    # Index PAS, organization number, unit and grouped names for /api/search
+    progress("search index")
+    write_search_index(search_rows(tree, df), db_file=db_file)
+
 def main():
     db_file = sys.argv[1] if len(sys.argv) > 1 else "data.db"
     build_full_org_tree(db_file=db_file)
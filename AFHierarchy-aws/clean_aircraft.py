@@ -1,5 +1,12 @@
 #!/usr/bin/env python3
+import os
 import sys
+import glob
+import time
+import shutil
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 
 # Columns to keep
@@ -24,41 +31,113 @@ KEEP_COLS = [
     "wuc_desc"
 ]
 
-def main():
-    if len(sys.argv) != 2:
-        print("Usage: python clean_aircraft.py <path_to_aircraft_csv>")
-        sys.exit(1)
+# Rows read and written per chunk, so memory stays flat for any file size
+CHUNK_ROWS = 200000
+
+def expand_inputs(patterns):
+    """
+    Expand each argument as a glob (keeping plain paths that match nothing,
+    so they fail loudly later) and drop duplicates, preserving order.
+    """
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) or [pattern]
+        for path in matches:
+            if path not in paths:
+                paths.append(path)
+    return paths
 
-    input_csv = sys.argv[1]
-    output_csv = "aircraft_filtered.csv"
+def clean_file(input_csv, output_csv, chunk_rows=CHUNK_ROWS, header=True):
+    """
+    Stream input_csv to output_csv in chunks, parsing only KEEP_COLS and
+    keeping every value as text. Columns missing from the input are written
+    empty. Returns per-file stats: rows, bytes, seconds and missing columns.
+    """
+    start = time.perf_counter()
+    columns = pd.read_csv(input_csv, nrows=0).columns
+    missing = [c for c in KEEP_COLS if c not in columns]
+    wanted = set(KEEP_COLS)
 
-    # Load full CSV
+    rows = 0
+    reader = pd.read_csv(
+        input_csv,
+        usecols=lambda c: c in wanted,
+        dtype=str,
+        chunksize=chunk_rows,
+    )
+    with open(output_csv, "w", newline="", encoding="utf-8") as out:
+        for chunk in reader:
+            chunk = chunk.reindex(columns=KEEP_COLS)
+            chunk.to_csv(out, index=False, header=header and rows == 0)
+            rows += len(chunk)
+        if rows == 0 and header:
+            pd.DataFrame(columns=KEEP_COLS).to_csv(out, index=False)
+    return {
+        "file": input_csv,
+        "rows": rows,
+        "bytes": os.path.getsize(input_csv),
+        "seconds": time.perf_counter() - start,
+        "missing": missing,
+    }
+
+def clean_files(inputs, output_csv, jobs=None, chunk_rows=CHUNK_ROWS):
+    """
+    Clean several inputs concurrently in a process pool, each into its own
+    part file, then append the parts in input order to output_csv under a
+    single header. Returns the per-file stats in input order.
+    """
+    tmp_dir = tempfile.mkdtemp(prefix="clean_aircraft-", dir=os.path.dirname(os.path.abspath(output_csv)))
     try:
-        df = pd.read_csv(input_csv, low_memory=False)
-    except Exception as e:
-        print(f"Error reading '{input_csv}': {e}")
-        sys.exit(1)
+        parts = [os.path.join(tmp_dir, f"part-{i:04d}.csv") for i in range(len(inputs))]
+        workers = jobs or min(len(inputs), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max(workers, 1)) as pool:
+            futures = [
+                pool.submit(clean_file, path, part, chunk_rows, i == 0)
+                for i, (path, part) in enumerate(zip(inputs, parts))
+            ]
+            stats = [f.result() for f in futures]
 
-    # Check for missing columns
-    missing = [c for c in KEEP_COLS if c not in df.columns]
-    if missing:
-        print("Warning: the following columns were not found in the input and will be filled with NaN:")
-        for c in missing:
-            print("  ", c)
-        # Add them as empty columns so selection won't fail
-        for c in missing:
-            df[c] = pd.NA
+        tmp_out = output_csv + ".tmp"
+        with open(tmp_out, "wb") as out:
+            for part in parts:
+                with open(part, "rb") as f:
+                    shutil.copyfileobj(f, out, 1024 * 1024)
+        os.replace(tmp_out, output_csv)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return stats
 
-    # Select only the columns we care about
-    df_filtered = df[KEEP_COLS]
+def main():
+    parser = argparse.ArgumentParser(
+        description="Keep only the aircraft columns the app uses, streaming one or more raw exports."
+    )
+    parser.add_argument("inputs", nargs="+", help="raw aircraft CSVs or glob patterns, e.g. 'g081_*.csv'")
+    parser.add_argument("-o", "--output", default="aircraft_filtered.csv", help="merged output CSV")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="files cleaned at once (default: one per CPU)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="rows per chunk")
+    args = parser.parse_args()
 
-    # Write out the slimmed CSV
+    inputs = expand_inputs(args.inputs)
+    start = time.perf_counter()
     try:
-        df_filtered.to_csv(output_csv, index=False)
-        print(f"Written {len(df_filtered)} rows × {len(KEEP_COLS)} columns to '{output_csv}'")
+        stats = clean_files(inputs, args.output, jobs=args.jobs, chunk_rows=args.chunk_rows)
     except Exception as e:
-        print(f"Error writing '{output_csv}': {e}")
+        print(f"Error cleaning aircraft CSVs: {e}")
         sys.exit(1)
+    elapsed = time.perf_counter() - start
+
+    for st in stats:
+        mb = st["bytes"] / 1e6
+        secs = max(st["seconds"], 1e-9)
+        print(f"  {st['file']}: {st['rows']} rows, {mb:.1f} MB in {secs:.2f}s "
+              f"({mb / secs:.1f} MB/s, {st['rows'] / secs:.0f} rows/s)")
+        if st["missing"]:
+            print("  Warning: columns not found and filled with NaN:", ", ".join(st["missing"]))
+
+    total = sum(st["rows"] for st in stats)
+    print(f"Written {total} rows × {len(KEEP_COLS)} columns from {len(stats)} file(s) "
+          f"to '{args.output}' in {elapsed:.2f}s")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,134 @@
+import os
+import pandas as pd
+
+# pyarrow is optional; without it no Parquet copies are kept and readers
+# fall back to SQLite or the CSVs
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+PARQUET_COMPRESSION = "zstd"
+
+# Arrow type per declared SQLite column type, for ParquetChunkWriter
+_ARROW_TYPES = {"INTEGER": pa.int64(), "REAL": pa.float64()} if pa is not None else {}
+
+def parquet_path(db_file, table_name):
+    """
+    Location of the Parquet copy of table_name, next to the database.
+    """
+    return os.path.join(os.path.dirname(db_file) or ".", f"{table_name}.parquet")
+
+def _typed(df):
+    # Object columns can mix str and float NaN; store them as nullable strings
+    out = df.copy()
+    for col in out.columns:
+        if out[col].dtype == object:
+            out[col] = out[col].astype("string")
+    return out
+
+def remove_parquet(path):
+    """
+    Drop a Parquet copy that is about to go stale, so readers fall back to
+    SQLite until a new one is written.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+
+def write_parquet(df, path):
+    """
+    Write df as a zstd-compressed Parquet file with dictionary-encoded
+    strings, swapped into place when complete. Without pyarrow any older
+    copy is removed instead, so readers never see stale data.
+    Returns True if the file was written.
+    """
+    if pq is None:
+        remove_parquet(path)
+        return False
+    table = pa.Table.from_pandas(_typed(df), preserve_index=False)
+    tmp = path + ".tmp"
+    pq.write_table(table, tmp, compression=PARQUET_COMPRESSION, use_dictionary=True)
+    os.replace(tmp, path)
+    return True
+
+class ParquetChunkWriter:
+    """
+    Parquet copy of a table that is streamed into SQLite chunk by chunk,
+    written as the chunks arrive so the table is never held whole. Columns
+    are typed from the declared SQLite types (INTEGER int64, REAL float64,
+    anything else string), as SQLite would store them. A chunk that does
+    not fit those types, or a missing pyarrow, leaves no copy at all.
+
+    Rows go to <path>.tmp; commit() swaps it into place, abort() drops it.
+    """
+    def __init__(self, path, columns):
+        """
+        columns: (name, declared SQLite type) pairs, e.g. from PRAGMA table_info.
+        """
+        self.path    = path
+        self.error   = None
+        self._writer = None
+        self._names  = [name for name, _ in columns]
+        if pa is None:
+            return
+        self._types  = [_ARROW_TYPES.get((decl or "").upper(), pa.string()) for _, decl in columns]
+        self._schema = pa.schema(list(zip(self._names, self._types)))
+
+    def _array(self, col, typ):
+        if typ == pa.string():
+            col = col.where(col.isna(), col.astype(str))
+        else:
+            col = pd.to_numeric(col)
+        return pa.array(col, type=typ, from_pandas=True)
+
+    def write(self, df):
+        if self.error or pa is None:
+            return
+        try:
+            arrays = [self._array(df[n], t) for n, t in zip(self._names, self._types)]
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(
+                    self.path + ".tmp", self._schema,
+                    compression=PARQUET_COMPRESSION, use_dictionary=True,
+                )
+            self._writer.write_table(pa.Table.from_arrays(arrays, schema=self._schema))
+        except (pa.ArrowException, ValueError, TypeError, KeyError) as e:
+            self.error = str(e)
+            self._close()
+
+    def _close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def commit(self):
+        """
+        Swap the copy into place; returns True if one was written. Any
+        older copy is removed either way.
+        """
+        self._close()
+        if self.error or not os.path.exists(self.path + ".tmp"):
+            self.abort()
+            remove_parquet(self.path)
+            return False
+        os.replace(self.path + ".tmp", self.path)
+        return True
+
+    def abort(self):
+        self._close()
+        tmp = self.path + ".tmp"
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def read_parquet(path, columns=None):
+    """
+    Read only the given columns (those present in the file) from a Parquet
+    copy. Returns None when pyarrow is missing or there is no copy.
+    """
+    if pq is None or not os.path.exists(path):
+        return None
+    if columns is not None:
+        present = set(pq.read_schema(path).names)
+        columns = [c for c in columns if c in present]
+    return pq.read_table(path, columns=columns).to_pandas()
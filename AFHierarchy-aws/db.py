@@ -1,45 +1,505 @@
 import sys
-import pandas as pd
+import time
+import queue
 import sqlite3
+import threading
+from contextlib import contextmanager
+import pandas as pd
+import metrics
+from columnar import ParquetChunkWriter, parquet_path, remove_parquet, write_parquet
+
+# Read-side tuning shared by every pooled connection
+READ_CACHE_KIB      = 65536            # page cache per connection (64 MiB)
+READ_MMAP_BYTES     = 256 * 1024 * 1024
+CACHED_STATEMENTS   = 256
+
+# Rows per chunk when streaming CSVs into SQLite
+CSV_CHUNK_ROWS      = 50000
+
+# Natural key of the aircraft table for delta loads
+AIRCRAFT_KEY        = "aircraft_serial_number"
+
+# Covering indexes for the status GROUP BY queries behind /api/stats,
+# all built on the normalized columns added by normalize_status
+AIRCRAFT_INDEXES = {
+    "assigned_pas": "assigned_unit_pas, status_prefix, nmc_subtype, active_flag, "
+                    "mission_design_series, current_assigned_base",
+    "status":       "status_prefix, nmc_subtype, active_flag",
+    "mds":          "mission_design_series, status_prefix, nmc_subtype, active_flag",
+    "base":         "current_assigned_base, status_prefix, nmc_subtype, active_flag",
+}
+
+def connect_writer(db_file):
+    """
+    Open a read-write connection and make sure the database is in WAL mode,
+    so pooled readers never block on (or behind) a loader or build.
+    """
+    conn = sqlite3.connect(db_file)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    Cursor that charges the time spent executing and fetching, and the rows
+    fetched, to its statement in the SQL metrics. Fetch costs are gathered
+    locally and reported when the result is exhausted or the cursor reused.
+    """
+    _statement = None
+    _seconds   = 0.0
+    _rows      = 0
+
+    def _flush(self):
+        if self._statement is not None and (self._seconds or self._rows):
+            metrics.observe_sql(self._statement, self._seconds, self._rows)
+        self._seconds, self._rows = 0.0, 0
+
+    def execute(self, sql, parameters=()):
+        self._flush()
+        self._statement = metrics.statement_label(sql)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            metrics.observe_sql(self._statement, time.perf_counter() - start, 0, calls=1)
+
+    def _fetched(self, start, rows, done):
+        self._seconds += time.perf_counter() - start
+        self._rows    += rows
+        if done:
+            self._flush()
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(start, row is not None, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        size = self.arraysize if size is None else size
+        rows = super().fetchmany(size)
+        self._fetched(start, len(rows), len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(start, len(rows), True)
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(start, 0, True)
+            raise
+        self._fetched(start, 1, False)
+        return row
+
+    def close(self):
+        self._flush()
+        super().close()
+
+class TimedConnection(sqlite3.Connection):
+    """
+    Connection whose cursors, including those made by execute(), are
+    TimedCursors.
+    """
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+class ReadConnectionPool:
+    """
+    Bounded pool of read-only SQLite connections shared by the Flask routes.
+    Connections keep their page cache, mmap and prepared statements warm
+    across requests instead of being opened and closed every time.
+    """
+    def __init__(self, db_file, size=8):
+        self.db_file = db_file
+        self.size    = size
+        self._idle   = queue.LifoQueue()
+        self._lock   = threading.Lock()
+        self._opened = 0
 
-def load_csv_to_sqlite(csv_file, db_file="data.db", table_name="organization"):
-    print("Loading CSV file...")
+    def _open(self):
+        # Read-only, so a missing database raises instead of being created;
+        # the loaders (connect_writer) are what switch it to WAL
+        conn = sqlite3.connect(
+            f"file:{self.db_file}?mode=ro",
+            uri=True,
+            check_same_thread=False,
+            cached_statements=CACHED_STATEMENTS,
+            factory=TimedConnection,
+        )
+        conn.execute(f"PRAGMA cache_size=-{READ_CACHE_KIB}")
+        conn.execute(f"PRAGMA mmap_size={READ_MMAP_BYTES}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+        if can_open:
+            try:
+                return self._open()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+        return self._idle.get()
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a pooled read-only connection for the duration of a block.
+        """
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            # Drop any open read transaction so writers can checkpoint
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def close_all(self):
+        """
+        Close idle connections, e.g. after the database file is replaced.
+        """
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+def warm_tables(db_file, tables):
+    """
+    Read every page of the given tables and their indexes once, so they sit
+    in the OS page cache that each process's mmap shares. Uses its own
+    connection, closed before returning; missing tables are skipped.
+    Returns the number of table rows read.
+    """
+    conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+    rows = 0
     try:
-        df = pd.read_csv(csv_file, low_memory=False)
-    except Exception as e:
-        raise Exception(f"Error reading CSV file: {e}")
-    
-    print(f"CSV loaded successfully with {len(df)} rows and {len(df.columns)} columns.")
+        for table in tables:
+            try:
+                for _ in conn.execute(f"SELECT * FROM {table}"):
+                    rows += 1
+                indexes = conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?", (table,)
+                ).fetchall()
+                for (index,) in indexes:
+                    conn.execute(f'SELECT COUNT(*) FROM {table} INDEXED BY "{index}"').fetchone()
+            except sqlite3.OperationalError:
+                continue
+    finally:
+        conn.close()
+    return rows
 
-    # Remove any rows where any column contains "Data Masked" (case-insensitive)
-    mask = df.apply(lambda row: any("data masked" in str(row[col]).lower() for col in df.columns), axis=1)
-    df = df[~mask]
-    print(f"After removing 'Data Masked' rows, {len(df)} rows remain.")
+def masked_rows(df):
+    """
+    Boolean mask of rows where any text column contains "Data Masked"
+    (case-insensitive), evaluated column-wise rather than per cell.
+    """
+    mask = pd.Series(False, index=df.index)
+    for col in df.select_dtypes(exclude=["number", "bool"]).columns:
+        mask |= df[col].astype(str).str.contains("data masked", case=False, regex=False)
+    return mask
 
-    print(f"Creating SQLite database '{db_file}' and table '{table_name}'...")
+def no_progress(stage, rows=None):
+    """
+    Default progress callback for loaders and builders: ignore updates.
+    """
+
+def load_csv_to_sqlite(csv_file, db_file="data.db", table_name="organization",
+                       chunk_rows=CSV_CHUNK_ROWS, progress=no_progress):
+    """
+    Stream the org CSV into SQLite in fixed-size chunks, dropping masked rows
+    as each chunk arrives. Rows go into a staging table which replaces
+    table_name only once the whole file has loaded. Each chunk is also
+    appended to a Parquet copy next to the database (see columnar.py),
+    swapped in after the table.
+
+    progress(stage, rows) is called as chunks are written.
+    """
+    print(f"Streaming CSV file in chunks of {chunk_rows} rows...")
+    staging = f"{table_name}_loading"
+    total = kept = 0
     try:
-        conn = sqlite3.connect(db_file)
-        df.to_sql(table_name, conn, if_exists='replace', index=False)
-        conn.commit()
-        print(f"Data loaded successfully into table '{table_name}' in database '{db_file}'.")
+        reader = pd.read_csv(csv_file, chunksize=chunk_rows, low_memory=False)
     except Exception as e:
-        raise Exception(f"Error loading data into SQLite: {e}")
+        raise Exception(f"Error reading CSV file: {e}")
+
+    path = parquet_path(db_file, table_name)
+    copy = None
+    conn = connect_writer(db_file)
+    try:
+        try:
+            conn.execute(f"DROP TABLE IF EXISTS {staging}")
+            for chunk in reader:
+                total += len(chunk)
+                chunk = chunk[~masked_rows(chunk)]
+                kept += len(chunk)
+                # to_sql commits after each call, so every chunk is one transaction
+                chunk.to_sql(staging, conn, if_exists="append", index=False)
+                if copy is None:
+                    # Typed like the columns the first chunk created
+                    copy = ParquetChunkWriter(
+                        path, [(r[1], r[2]) for r in conn.execute(f"PRAGMA table_info({staging})")]
+                    )
+                copy.write(chunk)
+                progress("loading", rows=kept)
+            if total == 0:
+                raise Exception("CSV file contains no rows")
+            print(f"Read {total} rows; after removing 'Data Masked' rows, {kept} rows remain.")
+
+            progress("swapping", rows=kept)
+            # The old copy goes first, so it can never outlive its table
+            remove_parquet(path)
+            with conn:
+                conn.execute(f"DROP TABLE IF EXISTS {table_name}")
+                conn.execute(f"ALTER TABLE {staging} RENAME TO {table_name}")
+            print(f"Data loaded successfully into table '{table_name}' in database '{db_file}'.")
+        except Exception as e:
+            if copy is not None:
+                copy.abort()
+            conn.execute(f"DROP TABLE IF EXISTS {staging}")
+            raise Exception(f"Error loading data into SQLite: {e}")
+
+        progress("columnar copy", rows=kept)
+        if copy.commit():
+            print(f"Columnar copy written to '{path}'.")
+        elif copy.error:
+            print(f"Columnar copy skipped: {copy.error}")
     finally:
         conn.close()
+    return kept
 
-def load_aircraft_csv_to_sqlite(csv_file, db_file="data.db", table_name="aircraft"):
+def row_hashes(df):
     """
-    Read the filtered aircraft CSV and write it into SQLite.
+    64-bit content hash per row, computed on the string form of every value
+    so the same row hashes the same across uploads.
     """
-    df = pd.read_csv(csv_file, low_memory=False)
-    conn = sqlite3.connect(db_file)
-    # Replace the table if it already exists
+    hashed = pd.util.hash_pandas_object(df.astype(str), index=False)
+    return pd.Series(hashed.to_numpy().view("int64"), index=df.index)
+
+def unit_links(df):
+    """
+    Explode each aircraft into (serial, pas) rows: its assigned_unit_pas plus
+    every PAS listed in its assigned_unit_hierarchy "[A, B, C]" string.
+    """
+    hierarchy = df["assigned_unit_hierarchy"] if "assigned_unit_hierarchy" in df.columns else pd.Series(dtype=str)
+    listed = (
+        hierarchy.dropna().astype(str)
+        .str.strip().str.strip("[]").str.split(",")
+        .explode().str.strip()
+    )
+    serials = df[AIRCRAFT_KEY]
+    links = pd.concat([
+        pd.DataFrame({"serial": serials, "pas": df["assigned_unit_pas"]}),
+        pd.DataFrame({"serial": serials.loc[listed.index], "pas": listed.to_numpy()}),
+    ])
+    links = links.dropna()
+    links["pas"] = links["pas"].astype(str).str.strip()
+    links = links[links["pas"] != ""]
+    return links.drop_duplicates()
+
+def _write_unit_links(conn, df, table_name, replace):
+    """
+    Insert link rows for df; with replace=True the link table is rebuilt.
+    Runs inside the caller's transaction.
+    """
+    link_table = f"{table_name}_unit_link"
+    if replace:
+        conn.execute(f"DROP TABLE IF EXISTS {link_table}")
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {link_table} (
+            serial TEXT NOT NULL,
+            pas    TEXT NOT NULL,
+            PRIMARY KEY (pas, serial)
+        ) WITHOUT ROWID
+    """)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{link_table}_serial ON {link_table}(serial)")
+    links = unit_links(df)
+    conn.executemany(
+        f"INSERT OR IGNORE INTO {link_table} VALUES (?, ?)",
+        zip(links["serial"].astype(str), links["pas"]),
+    )
+
+def normalize_status(df):
+    """
+    Add indexable status columns derived once at ingest:
+      status_prefix  FMC, PMC or NMC from current_condition_detail, OTHER for
+                     any other non-empty status, NULL when missing
+      nmc_subtype    NMCM, NMCS or NMCB, else NULL
+      active_flag    1 if active_inventory is Y, 0 otherwise, NULL if unknown
+    """
+    status = df["current_condition_detail"].astype(str).str.strip().str.upper()
+    status = status.where(df["current_condition_detail"].notna() & (status != ""))
+    prefix = status.str.extract(r"^(FMC|PMC|NMC)", expand=False)
+    df["status_prefix"] = prefix.where(prefix.notna() | status.isna(), "OTHER")
+    df["nmc_subtype"] = status.str.extract(r"^(NMC[MSB])", expand=False)
+    if "active_inventory" in df.columns:
+        active = df["active_inventory"].astype(str).str.strip().str.upper().eq("Y").astype("Int64")
+        df["active_flag"] = active.where(df["active_inventory"].notna())
+    else:
+        df["active_flag"] = pd.NA
+    return df
+
+# Per-table change counters, bumped in the same transaction as each write,
+# so caches built from a table can tell when it has changed
+DATA_VERSION_TABLE = "data_versions"
+
+def bump_data_version(conn, name):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {DATA_VERSION_TABLE} (
+            name    TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+    """)
+    conn.execute(f"""
+        INSERT INTO {DATA_VERSION_TABLE} (name, version) VALUES (?, 1)
+        ON CONFLICT(name) DO UPDATE SET version = version + 1
+    """, (name,))
+
+def data_version(conn, name):
+    """
+    Current change counter of table name; 0 if it was never written.
+    """
+    try:
+        row = conn.execute(
+            f"SELECT version FROM {DATA_VERSION_TABLE} WHERE name = ?", (name,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] if row else 0
+
+def _replace_aircraft(conn, df, table_name):
     df.to_sql(table_name, conn, if_exists="replace", index=False)
-    # Create an index on assigned_unit_pas for fast lookups
-    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_assigned_pas ON {table_name}(assigned_unit_pas)")
+    for name, cols in AIRCRAFT_INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_{name} ON {table_name}({cols})")
+    conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{table_name}_serial ON {table_name}({AIRCRAFT_KEY})")
+    _write_unit_links(conn, df, table_name, replace=True)
+    bump_data_version(conn, table_name)
     conn.commit()
-    conn.close()
-    print(f"Loaded {len(df)} rows into '{table_name}' table in '{db_file}'.")
+
+def load_aircraft_csv_to_sqlite(csv_file, db_file="data.db", table_name="aircraft",
+                                incremental=True, progress=no_progress):
+    """
+    Read the filtered aircraft CSV and write it into SQLite.
+
+    With incremental=True rows are matched on aircraft_serial_number and a
+    per-row content hash, and only inserted, changed or retired aircraft
+    are written. The table is fully replaced on the first load, when the
+    column layout changes, or with incremental=False.
+
+    Normalized status_prefix, nmc_subtype and active_flag columns are
+    added for indexed statistics (see normalize_status).
+
+    Every aircraft is also linked to each PAS in its assigned_unit_hierarchy
+    in the indexed <table_name>_unit_link(serial, pas) table, and the whole
+    normalized table is kept as a Parquet copy next to the database.
+    Each load that changes anything bumps the table's data_version.
+
+    Returns the change set: mode ("full" or "delta"), lists of inserted,
+    updated and retired serials, and affected_pas, every PAS that gained
+    or lost an aircraft, for refreshing downstream rollups.
+    """
+    progress("reading")
+    df = pd.read_csv(csv_file, low_memory=False)
+    df = df.drop_duplicates(subset=[AIRCRAFT_KEY], keep="last")
+    df["row_hash"] = row_hashes(df)
+    df = normalize_status(df)
+    progress("comparing", rows=len(df))
+
+    # Readers must not pick up the old copy once the table starts changing
+    remove_parquet(parquet_path(db_file, table_name))
+    conn = connect_writer(db_file)
+    try:
+        existing = [r[1] for r in conn.execute(f"PRAGMA table_info({table_name})")]
+        if not incremental or existing != list(df.columns):
+            progress("replacing", rows=len(df))
+            old_pas = set()
+            if "assigned_unit_pas" in existing:
+                old_pas = {r[0] for r in conn.execute(f"SELECT DISTINCT assigned_unit_pas FROM {table_name}")}
+            _replace_aircraft(conn, df, table_name)
+            changes = {
+                "mode": "full",
+                "inserted": df[AIRCRAFT_KEY].tolist(),
+                "updated": [],
+                "retired": [],
+                "affected_pas": old_pas | set(df["assigned_unit_pas"].dropna()),
+            }
+        else:
+            old = pd.read_sql_query(
+                f"SELECT {AIRCRAFT_KEY}, row_hash, assigned_unit_pas FROM {table_name}", conn
+            )
+            merged = df[[AIRCRAFT_KEY, "row_hash", "assigned_unit_pas"]].merge(
+                old, on=AIRCRAFT_KEY, how="outer", suffixes=("", "_old"), indicator=True
+            )
+            is_new     = merged["_merge"] == "left_only"
+            is_retired = merged["_merge"] == "right_only"
+            is_changed = (merged["_merge"] == "both") & (merged["row_hash"] != merged["row_hash_old"])
+            touched    = merged[is_new | is_retired | is_changed]
+
+            changes = {
+                "mode": "delta",
+                "inserted": merged.loc[is_new, AIRCRAFT_KEY].tolist(),
+                "updated": merged.loc[is_changed, AIRCRAFT_KEY].tolist(),
+                "retired": merged.loc[is_retired, AIRCRAFT_KEY].tolist(),
+                "affected_pas": set(touched["assigned_unit_pas"].dropna())
+                                | set(touched["assigned_unit_pas_old"].dropna()),
+            }
+
+            progress("writing", rows=len(touched))
+            staging = f"{table_name}_delta"
+            upserts = df[df[AIRCRAFT_KEY].isin(changes["inserted"] + changes["updated"])]
+            upserts.to_sql(staging, conn, if_exists="replace", index=False)
+            cols = ", ".join(df.columns)
+            link_table = f"{table_name}_unit_link"
+            has_links = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (link_table,)
+            ).fetchone()
+            removed = [(k,) for k in changes["updated"] + changes["retired"]]
+            with conn:
+                conn.executemany(f"DELETE FROM {table_name} WHERE {AIRCRAFT_KEY} = ?", removed)
+                conn.execute(f"INSERT INTO {table_name} ({cols}) SELECT {cols} FROM {staging}")
+                conn.execute(f"DROP TABLE {staging}")
+                if has_links:
+                    conn.executemany(f"DELETE FROM {link_table} WHERE serial = ?", [(str(k),) for (k,) in removed])
+                    _write_unit_links(conn, upserts, table_name, replace=False)
+                else:
+                    # Databases loaded before the link table existed
+                    _write_unit_links(conn, df, table_name, replace=True)
+                if len(touched) or not has_links:
+                    bump_data_version(conn, table_name)
+    finally:
+        conn.close()
+
+    progress("columnar copy", rows=len(df))
+    write_parquet(df, parquet_path(db_file, table_name))
+
+    print(
+        f"Loaded aircraft into '{table_name}' in '{db_file}' ({changes['mode']}): "
+        f"{len(changes['inserted'])} inserted, {len(changes['updated'])} updated, "
+        f"{len(changes['retired'])} retired, {len(changes['affected_pas'])} PAS affected."
+    )
+    return changes
 
 def main():
     if len(sys.argv) < 2:
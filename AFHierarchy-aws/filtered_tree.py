@@ -0,0 +1,150 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from db import data_version
+from flat_tree import flat_json, nested_json
+from snapshot import make_snapshot
+
+# Dropdown filters accepted by the aircraft endpoints and the pruned tree:
+# param → column, in cache key order. status matches the raw condition
+# exactly; status_prefix matches the normalized class, so NMC takes in
+# NMCM, NMCS and NMCB too
+AIRCRAFT_FILTERS = {
+    "mds":           "mission_design_series",
+    "base":          "current_assigned_base",
+    "status":        "current_condition_detail",
+    "status_prefix": "status_prefix",
+}
+ORG_TABLE = "organization"
+
+def tree_filters(args):
+    """
+    The non-empty AIRCRAFT_FILTERS in args as a hashable tuple of
+    (name, value) pairs, empty when the unfiltered tree is wanted.
+    """
+    pairs = []
+    for name in AIRCRAFT_FILTERS:
+        value = args.get(name, "").strip()
+        if value:
+            pairs.append((name, value))
+    return tuple(pairs)
+
+def filter_clauses(args, skip=None):
+    """
+    WHERE clauses and parameters for the AIRCRAFT_FILTERS set in args,
+    leaving out the one named by skip (used for facet counts).
+    """
+    where, params = [], []
+    for param, col in AIRCRAFT_FILTERS.items():
+        value = args.get(param, "").strip()
+        if value and param != skip:
+            where.append(f"aircraft.{col} = ?")
+            params.append(value)
+    return where, params
+
+def visible_clauses(conn):
+    """
+    Exclude transient aircraft and (when the column exists) aircraft in
+    storage, matching what the details pane has always hidden.
+    """
+    where = ["COALESCE(aircraft.current_condition_detail, '') NOT LIKE '%tran%'"]
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(aircraft)")}
+    if "location" in cols:
+        where.append("COALESCE(aircraft.location, '') NOT LIKE '%in storage%'")
+    return where
+
+def matching_pas(conn, filters):
+    """
+    Every PAS linked (directly or through its assigned_unit_hierarchy) to
+    an aircraft the details pane would list under the same filters.
+    """
+    where, params = filter_clauses(dict(filters))
+    cur = conn.execute(f"""
+        SELECT DISTINCT l.pas
+        FROM aircraft
+        JOIN aircraft_unit_link l ON l.serial = CAST(aircraft.aircraft_serial_number AS TEXT)
+        WHERE {" AND ".join(where + visible_clauses(conn))}
+    """, params)
+    return [r[0] for r in cur.fetchall()]
+
+def root_parent_pas(conn, pas):
+    """
+    The raw parent code of the root as the build read it: the last org row
+    for its PAS, "" when that row has none.
+    """
+    row = conn.execute(f"""
+        SELECT parent_pas FROM {ORG_TABLE}
+        WHERE TRIM(pas) = ? ORDER BY rowid DESC LIMIT 1
+    """, (pas,)).fetchone()
+    return str(row[0]).strip() if row and row[0] is not None else ""
+
+def prune_flat(flat, keep_pas):
+    """
+    Cut a FlatTree down to the root, the nodes in keep_pas and their
+    ancestors. Returns the (pas, label, parent, end) arrays of the result,
+    still in pre-order.
+    """
+    hit = np.zeros(flat.n, dtype=np.int64)
+    for pas in keep_pas:
+        i = flat.find(pas)
+        if i >= 0:
+            hit[i] = 1
+    # A node stays if its subtree i .. end[i] - 1 holds any hit
+    hits = np.concatenate(([0], np.cumsum(hit)))
+    keep = hits[flat.end] - hits[:-1] > 0
+    keep[0] = True
+    idx = np.flatnonzero(keep)
+    # Kept nodes before position j, so the new index of kept node i is
+    # before[i] and a subtree ending at end[i] now ends at before[end[i]]
+    before = np.concatenate(([0], np.cumsum(keep)))
+    parent = flat.parent[idx]
+    parent = np.where(parent >= 0, before[np.maximum(parent, 0)], -1)
+    end = before[flat.end[idx]]
+    i_list = idx.tolist()
+    return [flat.pas(i) for i in i_list], [flat.label(i) for i in i_list], parent, end
+
+def build_filtered(conn, flat, filters, nested=False):
+    """
+    JSON bytes of the tree pruned to units with aircraft matching filters,
+    flat by default or nested like full_org_tree.json.
+    """
+    pas, label, parent, end = prune_flat(flat, matching_pas(conn, filters))
+    if nested:
+        return nested_json(pas, label, parent, root_parent_pas(conn, pas[0]))
+    return flat_json(pas, label, parent, end, filters=dict(filters))
+
+class FilteredTreeCache:
+    """
+    Bounded LRU of filtered tree Snapshots. Keys hold the filters, the
+    format, the ETag of the tree they were cut from and the aircraft
+    data_version, so a new build or aircraft load makes older entries
+    unreachable and they age out.
+    """
+    def __init__(self, maxsize=32):
+        self.maxsize  = maxsize
+        self._entries = OrderedDict()
+        self._lock    = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def get(self, conn, flat, tree_etag, filters, nested=False):
+        key = (filters, nested, tree_etag, data_version(conn, "aircraft"))
+        with self._lock:
+            snap = self._entries.get(key)
+            if snap is not None:
+                self._entries.move_to_end(key)
+                return snap
+        snap = make_snapshot(build_filtered(conn, flat, filters, nested))
+        with self._lock:
+            self._entries[key] = snap
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return snap
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,208 @@
+import os
+import json
+import mmap
+import struct
+import threading
+import numpy as np
+
+# Flat snapshot of the pruned tree, nodes in pre-order:
+#   pas[i], label[i]  node i's code and label
+#   parent[i]         index of its parent, -1 for the root
+#   end[i]            one past its last descendant, so its subtree is
+#                     i .. end[i] - 1 and its children are i + 1, end[i + 1], ...
+#
+# The binary form holds the same arrays, little-endian, 8-byte aligned:
+#   header     magic "AFHT", version, node count, reserved   (4s I I I)
+#   parent     int32[n]
+#   end        int32[n]
+#   by_pas     int32[n]   node indexes ordered by PAS, for binary search
+#   pas_off    uint64[n + 1] offsets of each PAS in the string blob
+#   label_off  uint64[n + 1] offsets of each label in the string blob
+#   blob       UTF-8 PAS codes followed by UTF-8 labels
+FLAT_MAGIC   = b"AFHT"
+FLAT_VERSION = 1
+_HEADER      = struct.Struct("<4sIII")
+
+def flat_paths(json_path):
+    """
+    (flat JSON path, binary path) written alongside a nested tree file.
+    """
+    base = os.path.splitext(json_path)[0]
+    return base + ".flat.json", base + ".bin"
+
+def _align(n):
+    return (n + 7) & ~7
+
+def _replace(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def flat_json(pas, label, parent, end, **extra):
+    """
+    The flat arrays as compact JSON bytes; extra keys are added as given.
+    """
+    return json.dumps({
+        "format": "flat",
+        "version": FLAT_VERSION,
+        **extra,
+        "pas": pas,
+        "label": label,
+        "parent": np.asarray(parent).tolist(),
+        "end": np.asarray(end).tolist(),
+    }, separators=(",", ":")).encode("utf-8")
+
+def nested_json(pas, label, parent, root_parent_pas=""):
+    """
+    The flat arrays as the nested {"PAS", "label", "parent_pas", "Children"}
+    JSON bytes of full_org_tree.json, written in one pre-order pass.
+    """
+    dumps = json.dumps
+    parts = []
+    depth = [0] * len(pas)
+    prev = -1
+    for i, p in enumerate(np.asarray(parent).tolist()):
+        d = depth[i] = depth[p] + 1 if p >= 0 else 0
+        if prev >= d:
+            parts.append("]}" * (prev - d + 1) + ",")
+        parts.append(
+            f'{{"PAS":{dumps(pas[i])},"label":{dumps(label[i])},'
+            f'"parent_pas":{dumps(pas[p] if p >= 0 else root_parent_pas)},"Children":['
+        )
+        prev = d
+    parts.append("]}" * (prev + 1))
+    return "".join(parts).encode("utf-8")
+
+def write_flat(pas, label, parent, end, json_path, bin_path):
+    """
+    Write the flat arrays as compact JSON and as the mmap-able binary.
+    pas and label are lists of str, parent and end integer arrays.
+    """
+    n = len(pas)
+    _replace(json_path, flat_json(pas, label, parent, end))
+
+    pas_b   = [p.encode("utf-8") for p in pas]
+    label_b = [s.encode("utf-8") for s in label]
+    by_pas  = np.array(sorted(range(n), key=pas_b.__getitem__), dtype="<i4")
+    lengths = np.fromiter((len(b) for b in pas_b + label_b), dtype=np.uint64, count=2 * n)
+    offsets = np.zeros(2 * n + 1, dtype="<u8")
+    np.cumsum(lengths, out=offsets[1:])
+    pas_off, label_off = offsets[:n + 1], offsets[n:]
+
+    parts = [
+        _HEADER.pack(FLAT_MAGIC, FLAT_VERSION, n, 0),
+        np.asarray(parent, dtype="<i4").tobytes(),
+        np.asarray(end, dtype="<i4").tobytes(),
+        by_pas.tobytes(),
+    ]
+    pad = _align(_HEADER.size + 12 * n) - (_HEADER.size + 12 * n)
+    parts += [b"\0" * pad, pas_off.tobytes(), label_off.tobytes(), b"".join(pas_b), b"".join(label_b)]
+    _replace(bin_path, b"".join(parts))
+
+class FlatTree:
+    """
+    Read-only view of a binary flat snapshot. The file is memory-mapped and
+    the arrays are numpy views onto it, so opening costs nothing per node
+    and forked workers share the pages.
+    """
+    def __init__(self, bin_path):
+        with open(bin_path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n, _ = _HEADER.unpack_from(self._mm, 0)
+        if magic != FLAT_MAGIC or version != FLAT_VERSION:
+            self._mm.close()
+            raise ValueError(f"'{bin_path}' is not a version {FLAT_VERSION} flat tree")
+        off = _HEADER.size
+        self.n      = n
+        self.parent = np.frombuffer(self._mm, dtype="<i4", count=n, offset=off)
+        self.end    = np.frombuffer(self._mm, dtype="<i4", count=n, offset=off + 4 * n)
+        self.by_pas = np.frombuffer(self._mm, dtype="<i4", count=n, offset=off + 8 * n)
+        off = _align(off + 12 * n)
+        self._pas_off   = np.frombuffer(self._mm, dtype="<u8", count=n + 1, offset=off)
+        self._label_off = np.frombuffer(self._mm, dtype="<u8", count=n + 1, offset=off + 8 * (n + 1))
+        self._blob      = off + 16 * (n + 1)
+
+    def __len__(self):
+        return self.n
+
+    def _text(self, offsets, i):
+        start = self._blob + int(offsets[i])
+        return self._mm[start:self._blob + int(offsets[i + 1])].decode("utf-8")
+
+    def pas(self, i):
+        return self._text(self._pas_off, i)
+
+    def label(self, i):
+        # Labels follow the PAS codes in the blob; their offsets continue on
+        return self._text(self._label_off, i)
+
+    def find(self, pas):
+        """
+        Index of the node with this PAS, or -1.
+        """
+        key = pas.encode("utf-8")
+        lo, hi = 0, self.n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            i = int(self.by_pas[mid])
+            start = self._blob + int(self._pas_off[i])
+            if self._mm[start:self._blob + int(self._pas_off[i + 1])] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.n and self.pas(int(self.by_pas[lo])) == pas:
+            return int(self.by_pas[lo])
+        return -1
+
+    def children(self, i):
+        kids = []
+        j, stop = i + 1, int(self.end[i])
+        while j < stop:
+            kids.append(j)
+            j = int(self.end[j])
+        return kids
+
+    def ancestors(self, i):
+        """
+        Indexes from the root down to i, inclusive.
+        """
+        path = []
+        while i >= 0:
+            path.append(i)
+            i = int(self.parent[i])
+        return path[::-1]
+
+    def close(self):
+        self.parent = self.end = self.by_pas = self._pas_off = self._label_off = None
+        self._mm.close()
+
+class FlatTreeSnapshot:
+    """
+    The FlatTree for the binary file on disk, reopened when build_json
+    replaces it (mtime or size change). Older views are left to the garbage
+    collector, since requests may still be reading them.
+    """
+    def __init__(self, bin_path):
+        self.bin_path = bin_path
+        self._lock    = threading.Lock()
+        self._key     = None
+        self._tree    = None
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def current(self):
+        """
+        Raises FileNotFoundError if no flat tree has been built yet.
+        """
+        st = os.stat(self.bin_path)
+        key = (st.st_mtime_ns, st.st_size)
+        if key != self._key:
+            with self._lock:
+                if key != self._key:
+                    self._tree = FlatTree(self.bin_path)
+                    self._key  = key
+        return self._tree
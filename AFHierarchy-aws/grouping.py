@@ -0,0 +1,105 @@
+import os
+import re
+import json
+import pandas as pd
+
+RULES_FILE = os.path.join(os.path.dirname(__file__), "grouping_rules.json")
+
+# Constructs that cannot live inside the combined matcher: backreferences
+# and named groups depend on group numbers and names it assigns itself,
+# and global inline flags such as (?i) are only valid at the very start
+_UNSUPPORTED = [
+    (re.compile(r"\\[1-9]"),                  "numbered backreferences"),
+    (re.compile(r"\(\?P?<(?![=!])"),            "named groups"),
+    (re.compile(r"\(\?P="),                    "named backreferences"),
+    (re.compile(r"\(\?[aiLmsux]+\)"),          "inline flags (use the scoped (?i:...) form)"),
+]
+_ESCAPED = re.compile(r"\\\\")
+
+def check_rule(pattern, label):
+    """
+    Raise ValueError unless pattern compiles on its own and uses nothing
+    the combined matcher cannot hold.
+    """
+    if not isinstance(pattern, str) or not pattern or not isinstance(label, str):
+        raise ValueError("pattern and label must be non-empty strings")
+    # Escaped backslashes cannot start a construct; blank them out first
+    bare = _ESCAPED.sub("__", pattern)
+    for construct, what in _UNSUPPORTED:
+        if construct.search(bare):
+            raise ValueError(f"{what} are not supported")
+    try:
+        re.compile(pattern, re.IGNORECASE)
+    except re.error as e:
+        raise ValueError(f"invalid regex: {e}")
+
+def load_rules(path=RULES_FILE):
+    """
+    Read grouping rules from a JSON list of {"pattern", "label"} objects.
+    Rules are tried in file order; the first pattern found anywhere in the
+    organization name (case-insensitive) decides the label. Every rule is
+    checked with check_rule; ValueError names the first bad one.
+    """
+    with open(path, encoding="utf-8") as f:
+        rules = json.load(f)
+    checked = []
+    for i, r in enumerate(rules):
+        try:
+            pattern, label = r["pattern"], r["label"]
+            check_rule(pattern, label)
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Grouping rule {i + 1} in '{path}': {e}")
+        checked.append((pattern, label))
+    return checked
+
+class GroupingRules:
+    """
+    All rules compiled into one regex, one alternative per rule, so a
+    name is matched in a single pass however many rules there are.
+    """
+    def __init__(self, rules):
+        self.rules  = list(rules)
+        self.labels = [label for _, label in self.rules]
+        # "(?:[\s\S]*?(?P<r0>p0)|[\s\S]*?(?P<r1>p1)|...)" anchored with match():
+        # alternatives are tried in order, so earlier rules keep priority
+        alternatives = "|".join(
+            rf"[\s\S]*?(?P<r{i}>{pattern})" for i, (pattern, _) in enumerate(self.rules)
+        )
+        self._matcher = re.compile(f"(?:{alternatives})", re.IGNORECASE) if self.rules else None
+
+    def group(self, name):
+        """
+        Grouped label for one organization_name, or the name itself.
+        """
+        if self._matcher is None:
+            return name
+        m = self._matcher.match(name)
+        if m is None:
+            return name
+        return self.labels[int(m.lastgroup[1:])]
+
+    def group_series(self, names):
+        """
+        Group a whole column, classifying each distinct name only once and
+        mapping the labels back through the factorized codes.
+        """
+        names = names.astype(str).fillna("nan")
+        codes, uniques = pd.factorize(names)
+        labels = pd.Index([self.group(n) for n in uniques], dtype=object)
+        return pd.Series(labels.take(codes), index=names.index, dtype=object)
+
+# path → (mtime_ns, GroupingRules) for compiled_rules
+_compiled = {}
+
+def compiled_rules(path=RULES_FILE):
+    """
+    GroupingRules for a rules file, compiled on first use and again only
+    after the file's modification time changes. Raises like load_rules;
+    a bad file is not cached, so fixing it takes effect on the next call.
+    """
+    mtime = os.stat(path).st_mtime_ns
+    cached = _compiled.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, GroupingRules(load_rules(path)))
+        _compiled[path] = cached
+    return cached[1]
@@ -0,0 +1,51 @@
+from db import connect_writer
+
+HIERARCHY_TABLE = "org_hierarchy"
+
+# Each node stores its pre-order position (lft) and the position of its
+# last descendant (rgt), so a subtree is the contiguous range lft..rgt.
+# Join this onto aircraft.assigned_unit_pas to scope a query to a subtree.
+SUBTREE_JOIN = f"""
+    JOIN {HIERARCHY_TABLE} sub_root ON sub_root.pas = ?
+    JOIN {HIERARCHY_TABLE} sub ON sub.lft BETWEEN sub_root.lft AND sub_root.rgt
+"""
+
+def write_hierarchy_index(rows, db_file="data.db"):
+    """
+    Persist the pruned tree as Euler-tour intervals per PAS, so descendant,
+    ancestor-path and depth lookups are indexed range scans. rows are
+    (pas, parent_pas, label, lft, rgt, depth) tuples as produced by
+    OrgTree.intervals.
+    """
+    conn = connect_writer(db_file)
+    try:
+        conn.execute(f"DROP TABLE IF EXISTS {HIERARCHY_TABLE}")
+        conn.execute(f"""
+            CREATE TABLE {HIERARCHY_TABLE} (
+                pas        TEXT PRIMARY KEY,
+                parent_pas TEXT,
+                label      TEXT,
+                lft        INTEGER NOT NULL,
+                rgt        INTEGER NOT NULL,
+                depth      INTEGER NOT NULL
+            )
+        """)
+        conn.executemany(f"INSERT OR IGNORE INTO {HIERARCHY_TABLE} VALUES (?, ?, ?, ?, ?, ?)", rows)
+        conn.execute(f"CREATE UNIQUE INDEX idx_{HIERARCHY_TABLE}_lft ON {HIERARCHY_TABLE}(lft, rgt, pas)")
+        conn.execute(f"CREATE INDEX idx_{HIERARCHY_TABLE}_parent ON {HIERARCHY_TABLE}(parent_pas)")
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"Hierarchy index written with {len(rows)} nodes to '{db_file}'.")
+
+def ancestor_path(conn, pas):
+    """
+    Return [(pas, label), ...] from the root down to and including <pas>.
+    """
+    cur = conn.execute(f"""
+        SELECT anc.pas, anc.label FROM {HIERARCHY_TABLE} node
+        JOIN {HIERARCHY_TABLE} anc ON anc.lft <= node.lft AND anc.rgt >= node.rgt
+        WHERE node.pas = ?
+        ORDER BY anc.lft
+    """, (pas,))
+    return cur.fetchall()
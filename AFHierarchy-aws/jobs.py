@@ -0,0 +1,299 @@
+import os
+import json
+import time
+import uuid
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # Windows: resource locks stay per process
+    fcntl = None
+
+ACTIVE_STATES = ("queued", "running")
+
+class Job:
+    """
+    State of one background job, updated by the worker as it progresses.
+    """
+    def __init__(self, kind, resources):
+        self.id        = uuid.uuid4().hex[:12]
+        self.kind      = kind
+        self.resources = tuple(sorted(resources))
+        self.state     = "queued"
+        self.stage     = "queued"
+        self.rows      = 0
+        self.message   = ""
+        self.result    = None
+        self.error     = None
+        self.created   = time.time()
+        self.started   = None
+        self.finished  = None
+        self.pid       = os.getpid()
+        self.stage_times = {}
+        self.on_change = None
+        self._stage_started = None
+
+    def progress(self, stage, rows=None):
+        """
+        Progress callback handed to loaders and builders.
+        """
+        if stage != self.stage:
+            self._close_stage()
+            self.stage = stage
+            self._stage_started = time.time()
+        if rows is not None:
+            self.rows = rows
+        self.changed()
+
+    def _close_stage(self):
+        if self._stage_started is not None:
+            elapsed = time.time() - self._stage_started
+            self.stage_times[self.stage] = round(self.stage_times.get(self.stage, 0.0) + elapsed, 4)
+            self._stage_started = None
+
+    def changed(self):
+        if self.on_change is not None:
+            self.on_change(self)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "state": self.state,
+            "stage": self.stage,
+            "rows": self.rows,
+            "message": self.message,
+            "result": self.result,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "pid": self.pid,
+            "stage_times": self.stage_times,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        """
+        Rebuild a Job recorded by another server process.
+        """
+        job = cls(d["kind"], d.get("resources", ()))
+        for k, v in d.items():
+            if k != "resources":
+                setattr(job, k, v)
+        return job
+
+class ResourceLock:
+    """
+    Lock for one named resource. Always a thread lock; given a lock
+    directory on POSIX it also holds an flock on <lock_dir>/<name>.lock,
+    so jobs in other server worker processes are serialized too.
+    """
+    def __init__(self, name, lock_dir=None):
+        self._thread = threading.Lock()
+        self._path   = os.path.join(lock_dir, f"{name}.lock") if lock_dir and fcntl else None
+        self._fd     = None
+
+    def acquire(self):
+        self._thread.acquire()
+        if self._path:
+            self._fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+
+    def release(self):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._thread.release()
+
+def pid_alive(pid):
+    """
+    True unless no process with this pid exists.
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        pass
+    return True
+
+class JobRunner:
+    """
+    Small thread pool for long-running uploads and builds. Jobs naming the
+    same resource (e.g. the database file) never run at the same time and
+    run in the order they were submitted; unrelated jobs run in parallel.
+
+    With a state_dir, every job is also recorded as <state_dir>/<id>.json
+    and resources are locked across processes, so any worker of a
+    multi-process server can report on, and serialize against, jobs that
+    another worker started.
+    """
+    def __init__(self, workers=2, keep=100, state_dir=None, on_finish=None):
+        self._pool  = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._jobs  = {}
+        self._locks = {}
+        self._lock  = threading.Lock()
+        # Per resource, ids of the jobs naming it in submission order; a job
+        # runs once it heads the queue of every resource it names
+        self._queues = {}
+        self._turn   = threading.Condition(self._lock)
+        self.keep   = keep
+        self.state_dir = state_dir
+        self.on_finish = on_finish
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+        if hasattr(os, "register_at_fork"):
+            # A fork while another thread holds the lock must not deadlock the child
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._lock   = threading.Lock()
+        self._locks  = {}
+        self._queues = {}
+        self._turn   = threading.Condition(self._lock)
+
+    def _my_turn(self, job):
+        return all(self._queues[r][0] == job.id for r in job.resources)
+
+    def _leave_queues(self, job):
+        with self._turn:
+            for r in job.resources:
+                queue = self._queues[r]
+                queue.remove(job.id)
+                if not queue:
+                    del self._queues[r]
+            self._turn.notify_all()
+
+    def _resource_locks(self, resources):
+        with self._lock:
+            return [self._locks.setdefault(r, ResourceLock(r, self.state_dir)) for r in resources]
+
+    def _state_path(self, job_id):
+        return os.path.join(self.state_dir, f"{job_id}.json")
+
+    def _save(self, job):
+        if not self.state_dir:
+            return
+        path = self._state_path(job.id)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(job.to_dict(), f)
+        os.replace(tmp, path)
+
+    def _load_saved(self):
+        if not self.state_dir:
+            return []
+        jobs = []
+        for name in os.listdir(self.state_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.state_dir, name), encoding="utf-8") as f:
+                    jobs.append(Job.from_dict(json.load(f)))
+            except (OSError, ValueError, KeyError):
+                continue
+        return jobs
+
+    def submit(self, kind, fn, *args, resources=(), **kwargs):
+        """
+        Queue fn(*args, progress=job.progress, **kwargs) and return the Job.
+        fn may return a (message, result) tuple describing the outcome.
+        """
+        job = Job(kind, resources)
+        job.on_change = self._save
+        with self._lock:
+            self._jobs[job.id] = job
+            for r in job.resources:
+                self._queues.setdefault(r, deque()).append(job.id)
+            # Forget the oldest finished jobs beyond the retention limit
+            done = [j for j in self._jobs.values() if j.finished]
+            for old in sorted(done, key=lambda j: j.finished)[:max(0, len(self._jobs) - self.keep)]:
+                del self._jobs[old.id]
+        job.changed()
+        if self.state_dir:
+            saved = [j for j in self._load_saved() if j.finished]
+            for old in sorted(saved, key=lambda j: j.finished)[:max(0, len(saved) - self.keep)]:
+                try:
+                    os.remove(self._state_path(old.id))
+                except OSError:
+                    pass
+        self._pool.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        locks = self._resource_locks(job.resources)
+        job.progress("waiting")
+        try:
+            # Earlier jobs on the same resources go first. Queues are filled in
+            # one step per submit, so they never disagree on order; the locks
+            # then serialize against jobs of other processes
+            with self._turn:
+                self._turn.wait_for(lambda: self._my_turn(job))
+            held = []
+            try:
+                # Locks are taken in sorted resource order, so jobs cannot deadlock
+                for lock in locks:
+                    lock.acquire()
+                    held.append(lock)
+                job.state   = "running"
+                job.started = time.time()
+                job.changed()
+                out = fn(*args, progress=job.progress, **kwargs)
+                if isinstance(out, tuple):
+                    job.message, job.result = out
+                job._close_stage()
+                job.state = "done"
+                job.stage = "done"
+            except Exception as e:
+                job._close_stage()
+                job.state = "failed"
+                job.error = str(e)
+                traceback.print_exc()
+            finally:
+                job.finished = time.time()
+                job.changed()
+                for lock in reversed(held):
+                    lock.release()
+        finally:
+            self._leave_queues(job)
+        if self.on_finish is not None:
+            self.on_finish(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.state_dir and all(c in "0123456789abcdef" for c in job_id):
+            try:
+                with open(self._state_path(job_id), encoding="utf-8") as f:
+                    job = Job.from_dict(json.load(f))
+            except (OSError, ValueError, KeyError):
+                pass
+        return job
+
+    def _all(self):
+        with self._lock:
+            jobs = dict(self._jobs)
+        for job in self._load_saved():
+            jobs.setdefault(job.id, job)
+        return list(jobs.values())
+
+    def recent(self, limit=10):
+        jobs = sorted(self._all(), key=lambda j: j.created, reverse=True)
+        return jobs[:limit]
+
+    def active(self):
+        """
+        Jobs still queued or running in a live process, this one or another.
+        """
+        return [j for j in self._all() if j.state in ACTIVE_STATES and pid_alive(j.pid)]
+
+    def shutdown(self, wait=True):
+        """
+        Stop taking jobs; with wait, block until queued and running ones finish.
+        """
+        self._pool.shutdown(wait=wait)
@@ -0,0 +1,304 @@
+import os
+import re
+import json
+import hashlib
+import time
+import atexit
+import threading
+from jobs import pid_alive
+
+# Upper bounds (seconds / bytes) of the histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+SIZE_BUCKETS    = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+# How often a worker writes its metrics for the others to merge
+DUMP_INTERVAL_S = 1.0
+SQL_LABEL_CHARS = 160
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+class Counter:
+    """
+    Monotonic total per label combination.
+    """
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name       = name
+        self.help       = help
+        self.labelnames = tuple(labelnames)
+        self._values    = {}
+        self._lock      = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def state(self):
+        with self._lock:
+            return [[list(k), v] for k, v in self._values.items()]
+
+    @staticmethod
+    def merge(into, value):
+        return (into or 0) + value
+
+    def render(self, merged):
+        lines = []
+        for key, value in sorted(merged.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Histogram:
+    """
+    Bucketed observations per label combination, Prometheus style.
+    """
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name       = name
+        self.help       = help
+        self.labelnames = tuple(labelnames)
+        self.buckets    = tuple(buckets)
+        self._values    = {}
+        self._lock      = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        with self._lock:
+            h = self._values.get(key)
+            if h is None:
+                # One count per bucket plus +Inf, then sum and count
+                h = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            h[0][i] += 1
+            h[1] += value
+            h[2] += 1
+
+    def state(self):
+        with self._lock:
+            return [[list(k), [list(h[0]), h[1], h[2]]] for k, h in self._values.items()]
+
+    @staticmethod
+    def merge(into, value):
+        if into is None:
+            return [list(value[0]), value[1], value[2]]
+        return [[a + b for a, b in zip(into[0], value[0])], into[1] + value[1], into[2] + value[2]]
+
+    def render(self, merged):
+        lines = []
+        for key, (counts, total, n) in sorted(merged.items()):
+            running = 0
+            for bound, c in zip(self.buckets + ("+Inf",), counts):
+                running += c
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, ('le', bound))} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {n}")
+        return lines
+
+class Registry:
+    """
+    All metrics of this process. With a state_dir, each process also
+    writes its totals to <state_dir>/metrics-<pid>.json about once a second,
+    and render() adds up the files of every live process so a scrape of any
+    worker covers the whole server. Files of exited processes are dropped:
+    each process removes its own at exit, and configure() clears any left
+    by processes that were killed.
+    """
+    def __init__(self):
+        self.metrics   = []
+        self.state_dir = None
+        self._dumped   = 0.0
+        self._lock     = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            # A forked worker starts from zero; the parent reports its own totals
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._lock   = threading.Lock()
+        self._dumped = 0.0
+        for m in self.metrics:
+            m._lock   = threading.Lock()
+            m._values = {}
+
+    def counter(self, name, help, labelnames=()):
+        m = Counter(name, help, labelnames)
+        self.metrics.append(m)
+        return m
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        m = Histogram(name, help, labelnames, buckets)
+        self.metrics.append(m)
+        return m
+
+    def configure(self, state_dir):
+        os.makedirs(state_dir, exist_ok=True)
+        self.state_dir = state_dir
+        for pid, path in self._files():
+            if not pid_alive(pid):
+                self._remove(path)
+        atexit.register(self.remove)
+
+    def state(self):
+        return {m.name: m.state() for m in self.metrics}
+
+    def _path(self, pid):
+        return os.path.join(self.state_dir, f"metrics-{pid}.json")
+
+    def dump(self):
+        if not self.state_dir:
+            return
+        path = self._path(os.getpid())
+        with self._lock:
+            self._dumped = time.monotonic()
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(self.state(), f)
+            os.replace(path + ".tmp", path)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def remove(self):
+        """
+        Drop this process's file, when it exits.
+        """
+        if self.state_dir:
+            self._remove(self._path(os.getpid()))
+
+    def _files(self):
+        """
+        (pid, path) of every process's metrics file.
+        """
+        files = []
+        for name in os.listdir(self.state_dir):
+            if name.startswith("metrics-") and name.endswith(".json"):
+                try:
+                    files.append((int(name[len("metrics-"):-len(".json")]), os.path.join(self.state_dir, name)))
+                except ValueError:
+                    continue
+        return files
+
+    def maybe_dump(self):
+        if self.state_dir and time.monotonic() - self._dumped >= DUMP_INTERVAL_S:
+            self.dump()
+
+    def _states(self):
+        states = [self.state()]
+        if not self.state_dir:
+            return states
+        own = os.getpid()
+        for pid, path in self._files():
+            if pid == own or not pid_alive(pid):
+                continue
+            try:
+                with open(path, encoding="utf-8") as f:
+                    states.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return states
+
+    def render(self):
+        """
+        Prometheus text exposition format (version 0.0.4).
+        """
+        states = self._states()
+        lines = []
+        for m in self.metrics:
+            merged = {}
+            for state in states:
+                for key, value in state.get(m.name, []):
+                    key = tuple(key)
+                    merged[key] = m.merge(merged.get(key), value)
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(m.render(merged))
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "afh_http_request_seconds", "Request latency including streamed bodies.",
+    ["method", "route", "status"])
+RESPONSE_BYTES = REGISTRY.histogram(
+    "afh_http_response_bytes", "Response body size as sent, after compression.",
+    ["route"], buckets=SIZE_BUCKETS)
+SQL_SECONDS = REGISTRY.counter(
+    "afh_sql_seconds_total", "Time spent executing and fetching, per SQL statement.", ["statement"])
+SQL_CALLS = REGISTRY.counter(
+    "afh_sql_calls_total", "Executions per SQL statement.", ["statement"])
+SQL_ROWS = REGISTRY.counter(
+    "afh_sql_rows_total", "Rows fetched per SQL statement.", ["statement"])
+JSON_SECONDS = REGISTRY.histogram(
+    "afh_json_encode_seconds", "Time spent encoding JSON response bodies.")
+TREE_LOAD_SECONDS = REGISTRY.histogram(
+    "afh_tree_load_seconds", "Time to read, serialize and compress full_org_tree.json.")
+JOB_STAGE_SECONDS = REGISTRY.histogram(
+    "afh_job_stage_seconds", "Duration of each ingest and build job stage.", ["job", "stage"])
+
+# Per-request totals for the slow request log, kept per thread
+_request = threading.local()
+
+def begin_request():
+    _request.sql_seconds = 0.0
+    _request.sql_calls   = 0
+
+def request_sql():
+    """
+    (seconds, statements) of SQL run on this thread since begin_request().
+    """
+    return getattr(_request, "sql_seconds", 0.0), getattr(_request, "sql_calls", 0)
+
+_statement_labels = {}
+_PLACEHOLDER_LIST = re.compile(r"\?(\s*,\s*\?)+")
+_SPACE = re.compile(r"\s+")
+
+def statement_label(sql):
+    """
+    Short, stable label for a SQL statement: whitespace collapsed, IN lists
+    of placeholders folded to "?...". Statements longer than SQL_LABEL_CHARS
+    are cut and tagged with a hash of the full text, so two statements that
+    share a long prefix stay apart.
+    """
+    label = _statement_labels.get(sql)
+    if label is None:
+        label = _PLACEHOLDER_LIST.sub("?...", _SPACE.sub(" ", sql).strip())
+        if len(label) > SQL_LABEL_CHARS:
+            digest = hashlib.sha1(label.encode("utf-8")).hexdigest()[:8]
+            label = f"{label[:SQL_LABEL_CHARS]}... [{digest}]"
+        if len(_statement_labels) < 4096:
+            _statement_labels[sql] = label
+    return label
+
+def observe_sql(statement, seconds, rows, calls=0):
+    SQL_SECONDS.inc(seconds, statement=statement)
+    if calls:
+        SQL_CALLS.inc(calls, statement=statement)
+    if rows:
+        SQL_ROWS.inc(rows, statement=statement)
+    if hasattr(_request, "sql_seconds"):
+        _request.sql_seconds += seconds
+        _request.sql_calls   += calls
+
+def observe_job(job):
+    """
+    Record the stage durations of a finished JobRunner job.
+    """
+    for stage, seconds in job.stage_times.items():
+        JOB_STAGE_SECONDS.observe(seconds, job=job.kind, stage=stage)
+    if job.started and job.finished:
+        JOB_STAGE_SECONDS.observe(job.finished - job.started, job=job.kind, stage="total")
+    REGISTRY.maybe_dump()
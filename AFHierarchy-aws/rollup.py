@@ -0,0 +1,305 @@
+import time
+from db import connect_writer
+from hierarchy import HIERARCHY_TABLE
+
+ROLLUP_TABLE = "org_rollup"
+
+# Dated copies of the rollup counts, one set per day with an ingest:
+# snapshots lists the days, history the non-empty subtree counts per day
+HISTORY_TABLE   = "org_rollup_history"
+SNAPSHOTS_TABLE = "org_rollup_snapshots"
+STATUS_KEYS  = ["FMC", "PMC", "NMC"]
+NMC_KEYS     = ["NMCM", "NMCS", "NMCB"]
+
+def _count_sql(has_location):
+    """
+    Return (aggregates, where): COUNT plus one SUM per status key, and the
+    filter that skips transient aircraft and (when known) ones in storage.
+    """
+    status = "COALESCE(aircraft.current_condition_detail, '')"
+    where = f"{status} NOT LIKE '%tran%'"
+    if has_location:
+        where += " AND COALESCE(aircraft.location, '') NOT LIKE '%in storage%'"
+    counts = ",\n".join(
+        f"SUM(CASE WHEN {status} LIKE '{k}%' THEN 1 ELSE 0 END)"
+        for k in STATUS_KEYS + NMC_KEYS
+    )
+    return f"COUNT(*),\n{counts}", where
+
+def _direct_counts_sql(has_location):
+    """
+    Per-PAS status counts for aircraft assigned directly to that PAS.
+    """
+    aggregates, where = _count_sql(has_location)
+    return f"""
+        SELECT assigned_unit_pas, {aggregates}
+        FROM aircraft
+        WHERE {where}
+        GROUP BY assigned_unit_pas
+    """
+
+def _mc_rate(total, fmc, pmc):
+    return round((fmc + pmc) / total * 100, 1) if total else 0.0
+
+def _rollup_row(pas, counts):
+    total, fmc, pmc, nmc, nmcm, nmcs, nmcb = counts
+    mc_rate = _mc_rate(total, fmc, pmc)
+    return (pas, total, fmc, pmc, nmc, nmcm, nmcs, nmcb, mc_rate)
+
+def _table_names(conn):
+    return {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+def write_rollups(db_file="data.db"):
+    """
+    Aggregate aircraft status counts bottom-up over the hierarchy index and
+    store subtree totals plus mission capable rate per PAS.
+    """
+    conn = connect_writer(db_file)
+    try:
+        cols = {r[1] for r in conn.execute("PRAGMA table_info(aircraft)")}
+        direct = {}
+        if cols:
+            for row in conn.execute(_direct_counts_sql("location" in cols)):
+                direct[str(row[0]).strip()] = list(row[1:])
+
+        nodes = conn.execute(f"SELECT pas, parent_pas FROM {HIERARCHY_TABLE} ORDER BY lft DESC").fetchall()
+        width = 1 + len(STATUS_KEYS) + len(NMC_KEYS)
+        totals = {}
+        # Descending lft visits every child before its parent
+        for pas, parent in nodes:
+            acc = totals.setdefault(pas, [0] * width)
+            for i, v in enumerate(direct.get(pas, ())):
+                acc[i] += v or 0
+            parent_acc = totals.setdefault(parent, [0] * width)
+            for i, v in enumerate(acc):
+                parent_acc[i] += v
+
+        rows = [_rollup_row(pas, totals[pas]) for pas, _ in nodes]
+
+        conn.execute(f"DROP TABLE IF EXISTS {ROLLUP_TABLE}")
+        conn.execute(f"""
+            CREATE TABLE {ROLLUP_TABLE} (
+                pas     TEXT PRIMARY KEY,
+                total   INTEGER,
+                fmc     INTEGER,
+                pmc     INTEGER,
+                nmc     INTEGER,
+                nmcm    INTEGER,
+                nmcs    INTEGER,
+                nmcb    INTEGER,
+                mc_rate REAL
+            )
+        """)
+        conn.executemany(f"INSERT INTO {ROLLUP_TABLE} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"Readiness rollups written for {len(rows)} nodes to '{db_file}'.")
+
+# Above this share of the tree affected, rebuilding every rollup is cheaper
+# than walking each changed PAS up to the root
+FULL_REFRESH_SHARE = 0.2
+
+def _affected_counts(conn, sql):
+    return {pas: [c or 0 for c in counts] for pas, *counts in conn.execute(sql)}
+
+def _count_deltas(conn, aggregates, where):
+    """
+    Signed per-PAS change in direct counts for the PAS in rollup_affected:
+    what aircraft now hold minus what the rollups hold, a node's own row
+    less its children's.
+    """
+    now = _affected_counts(conn, f"""
+        SELECT x.pas, {aggregates}
+        FROM rollup_affected x
+        JOIN aircraft ON aircraft.assigned_unit_pas = x.pas
+        WHERE {where}
+        GROUP BY x.pas
+    """)
+    held = _affected_counts(conn, f"""
+        SELECT r.pas, r.total, r.fmc, r.pmc, r.nmc, r.nmcm, r.nmcs, r.nmcb
+        FROM rollup_affected x
+        JOIN {ROLLUP_TABLE} r ON r.pas = x.pas
+    """)
+    children = _affected_counts(conn, f"""
+        SELECT h.parent_pas, SUM(r.total), SUM(r.fmc), SUM(r.pmc), SUM(r.nmc),
+               SUM(r.nmcm), SUM(r.nmcs), SUM(r.nmcb)
+        FROM rollup_affected x
+        JOIN {HIERARCHY_TABLE} h ON h.parent_pas = x.pas
+        JOIN {ROLLUP_TABLE} r ON r.pas = h.pas
+        GROUP BY h.parent_pas
+    """)
+    width = 1 + len(STATUS_KEYS) + len(NMC_KEYS)
+    zero = [0] * width
+    deltas = {}
+    for (pas,) in conn.execute("SELECT pas FROM rollup_affected"):
+        n, h, c = now.get(pas, zero), held.get(pas, zero), children.get(pas, zero)
+        delta = [n[i] - (h[i] - c[i]) for i in range(width)]
+        if any(delta):
+            deltas[pas] = delta
+    return deltas
+
+def refresh_rollups(db_file, affected_pas, full=False):
+    """
+    Bring rollups up to date after an aircraft load. Each affected PAS's
+    direct counts are compared with what its rollup currently holds, and
+    the signed difference is added to it and to every ancestor. With
+    full=True (the aircraft table was replaced), or when affected_pas
+    covers more than FULL_REFRESH_SHARE of the tree, write_rollups rebuilds
+    them all instead. Returns the number of rows changed, or 0 if
+    build_json has not produced rollups yet.
+    """
+    conn = connect_writer(db_file)
+    try:
+        tables = _table_names(conn)
+        if not {HIERARCHY_TABLE, ROLLUP_TABLE, "aircraft"} <= tables or not affected_pas:
+            return 0
+        nodes = conn.execute(f"SELECT COUNT(*) FROM {HIERARCHY_TABLE}").fetchone()[0]
+        rebuild = full or len(affected_pas) > FULL_REFRESH_SHARE * nodes
+        rows = []
+        if not rebuild:
+            cols = {r[1] for r in conn.execute("PRAGMA table_info(aircraft)")}
+            aggregates, where = _count_sql("location" in cols)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("CREATE TEMP TABLE IF NOT EXISTS rollup_affected (pas TEXT PRIMARY KEY)")
+                conn.execute("DELETE FROM rollup_affected")
+                conn.executemany(
+                    f"""INSERT OR IGNORE INTO rollup_affected
+                        SELECT pas FROM {HIERARCHY_TABLE} WHERE pas = ?""",
+                    [(str(p).strip(),) for p in affected_pas],
+                )
+                deltas = _count_deltas(conn, aggregates, where)
+
+                # Sum the deltas up each ancestor chain
+                parent_of = {}
+                totals = {}
+                for pas, delta in deltas.items():
+                    while pas is not None:
+                        acc = totals.setdefault(pas, [0] * len(delta))
+                        for i, v in enumerate(delta):
+                            acc[i] += v
+                        if pas not in parent_of:
+                            # None past the root, whose parent is outside the tree
+                            row = conn.execute(f"""
+                                SELECT p.pas FROM {HIERARCHY_TABLE} c
+                                JOIN {HIERARCHY_TABLE} p ON p.pas = c.parent_pas
+                                WHERE c.pas = ?
+                            """, (pas,)).fetchone()
+                            parent_of[pas] = row[0] if row else None
+                        pas = parent_of[pas]
+
+                for pas, delta in totals.items():
+                    if not any(delta):
+                        continue
+                    row = conn.execute(f"""
+                        SELECT total, fmc, pmc, nmc, nmcm, nmcs, nmcb
+                        FROM {ROLLUP_TABLE} WHERE pas = ?
+                    """, (pas,)).fetchone() or [0] * len(delta)
+                    rows.append(_rollup_row(pas, [a + b for a, b in zip(row, delta)]))
+                conn.executemany(f"INSERT OR REPLACE INTO {ROLLUP_TABLE} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    finally:
+        conn.close()
+    if rebuild:
+        write_rollups(db_file)
+        return nodes
+    print(f"Refreshed readiness rollups for {len(rows)} nodes.")
+    return len(rows)
+
+def get_rollup(conn, pas):
+    """
+    Return the stored rollup for <pas> as a dict, or None if missing.
+    """
+    cur = conn.execute(f"""
+        SELECT total, fmc, pmc, nmc, nmcm, nmcs, nmcb, mc_rate
+        FROM {ROLLUP_TABLE} WHERE pas = ?
+    """, (pas,))
+    row = cur.fetchone()
+    if row is None:
+        return None
+    total, fmc, pmc, nmc, nmcm, nmcs, nmcb, mc_rate = row
+    return {
+        "pas": pas,
+        "total": total,
+        "status": {"FMC": fmc, "PMC": pmc, "NMC": nmc},
+        "nmc": {"NMCM": nmcm, "NMCS": nmcs, "NMCB": nmcb},
+        "mc_rate": mc_rate,
+    }
+
+def record_history(db_file, day=None):
+    """
+    Copy the current rollups into the history as the snapshot for day
+    (YYYY-MM-DD, default today), replacing an earlier snapshot of the same
+    day. Only subtrees holding aircraft are stored; a PAS missing from a
+    recorded day had none. Returns the number of rows stored, or 0 if
+    build_json has not produced rollups yet.
+    """
+    day = day or time.strftime("%Y-%m-%d")
+    conn = connect_writer(db_file)
+    try:
+        if ROLLUP_TABLE not in _table_names(conn):
+            return 0
+        with conn:
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {SNAPSHOTS_TABLE} (
+                    day         TEXT PRIMARY KEY,
+                    recorded_at INTEGER NOT NULL
+                )
+            """)
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {HISTORY_TABLE} (
+                    pas   TEXT NOT NULL,
+                    day   TEXT NOT NULL,
+                    total INTEGER NOT NULL,
+                    fmc   INTEGER NOT NULL,
+                    pmc   INTEGER NOT NULL,
+                    nmc   INTEGER NOT NULL,
+                    nmcm  INTEGER NOT NULL,
+                    nmcs  INTEGER NOT NULL,
+                    nmcb  INTEGER NOT NULL,
+                    PRIMARY KEY (pas, day)
+                ) WITHOUT ROWID
+            """)
+            conn.execute(f"DELETE FROM {HISTORY_TABLE} WHERE day = ?", (day,))
+            rows = conn.execute(f"""
+                INSERT INTO {HISTORY_TABLE}
+                SELECT pas, ?, total, fmc, pmc, nmc, nmcm, nmcs, nmcb
+                FROM {ROLLUP_TABLE}
+                WHERE total > 0
+            """, (day,)).rowcount
+            conn.execute(
+                f"INSERT OR REPLACE INTO {SNAPSHOTS_TABLE} VALUES (?, ?)", (day, int(time.time()))
+            )
+    finally:
+        conn.close()
+    print(f"Readiness history recorded for {rows} nodes on {day}.")
+    return rows
+
+def get_trend(conn, pas, start, end):
+    """
+    Return the recorded rollups of <pas> for every snapshot day from start
+    to end (YYYY-MM-DD, inclusive), oldest first, as one range scan of the
+    (pas, day) key. Days on which <pas> held no aircraft count as zero.
+    """
+    cur = conn.execute(f"""
+        SELECT s.day, h.total, h.fmc, h.pmc, h.nmc, h.nmcm, h.nmcs, h.nmcb
+        FROM {SNAPSHOTS_TABLE} s
+        LEFT JOIN {HISTORY_TABLE} h ON h.pas = ? AND h.day = s.day
+        WHERE s.day BETWEEN ? AND ?
+        ORDER BY s.day
+    """, (pas, start, end))
+    points = []
+    for day, *counts in cur.fetchall():
+        total, fmc, pmc, nmc, nmcm, nmcs, nmcb = [c or 0 for c in counts]
+        points.append({
+            "date": day,
+            "total": total,
+            "status": {"FMC": fmc, "PMC": pmc, "NMC": nmc},
+            "nmc": {"NMCM": nmcm, "NMCS": nmcs, "NMCB": nmcb},
+            "mc_rate": _mc_rate(total, fmc, pmc),
+        })
+    return points
@@ -0,0 +1,88 @@
+import re
+import sqlite3
+from db import connect_writer
+from hierarchy import HIERARCHY_TABLE
+
+SEARCH_TABLE = "org_search"
+SEARCH_COLUMNS = ["pas", "organization_no", "unit", "grouped"]
+
+# bm25 weight per column: a PAS or organization number hit outranks a
+# word in the unit name, which outranks the grouped name
+SEARCH_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+def write_search_index(rows, db_file="data.db"):
+    """
+    (Re)build the unit search index from (pas, organization_no, unit,
+    grouped) rows. Uses an FTS5 table with prefix indexes; if this SQLite
+    lacks FTS5, a plain table searched with LIKE instead.
+    """
+    conn = connect_writer(db_file)
+    try:
+        conn.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+        try:
+            conn.execute(f"""
+                CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(
+                    {", ".join(SEARCH_COLUMNS)},
+                    tokenize = 'unicode61',
+                    prefix = '1 2 3'
+                )
+            """)
+        except sqlite3.OperationalError:
+            conn.execute(f"""
+                CREATE TABLE {SEARCH_TABLE} (
+                    pas TEXT, organization_no TEXT, unit TEXT, grouped TEXT, terms TEXT
+                )
+            """)
+            rows = [(*r, " " + " ".join(_TOKEN.findall(" ".join(r).lower()))) for r in rows]
+        placeholders = ", ".join("?" for _ in rows[0]) if rows else ""
+        if rows:
+            conn.executemany(f"INSERT INTO {SEARCH_TABLE} VALUES ({placeholders})", rows)
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"Search index written for {len(rows)} units to '{db_file}'.")
+
+def _is_fts(conn):
+    sql = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE name = ?", (SEARCH_TABLE,)
+    ).fetchone()
+    if sql is None:
+        raise sqlite3.OperationalError(f"no such table: {SEARCH_TABLE}")
+    return "fts5" in sql[0].lower()
+
+def search_units(conn, q, limit=20):
+    """
+    Ranked hits for q: every word of q must start a word in one of the
+    indexed columns. An exact PAS match ranks first, then bm25 relevance,
+    then shallower units. Returns (pas, organization_no, unit, grouped,
+    label, depth) rows.
+    """
+    tokens = _TOKEN.findall(q.lower())
+    if not tokens:
+        return []
+    exact = q.strip().upper()
+    if _is_fts(conn):
+        match = " AND ".join('"' + t.replace('"', '""') + '"*' for t in tokens)
+        sql = f"""
+            SELECT s.pas, s.organization_no, s.unit, s.grouped, h.label, h.depth
+            FROM {SEARCH_TABLE} s
+            JOIN {HIERARCHY_TABLE} h ON h.pas = s.pas
+            WHERE {SEARCH_TABLE} MATCH ?
+            ORDER BY s.pas = ? DESC, bm25({SEARCH_TABLE}, {", ".join(map(str, SEARCH_WEIGHTS))}), h.depth, h.lft
+            LIMIT ?
+        """
+        params = [match, exact, limit]
+    else:
+        where = " AND ".join("s.terms LIKE ?" for _ in tokens)
+        sql = f"""
+            SELECT s.pas, s.organization_no, s.unit, s.grouped, h.label, h.depth
+            FROM {SEARCH_TABLE} s
+            JOIN {HIERARCHY_TABLE} h ON h.pas = s.pas
+            WHERE {where}
+            ORDER BY s.pas = ? DESC, h.depth, h.lft
+            LIMIT ?
+        """
+        params = [f"% {t}%" for t in tokens] + [exact, limit]
+    return conn.execute(sql, params).fetchall()
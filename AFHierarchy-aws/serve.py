@@ -0,0 +1,143 @@
+"""
+Production entry point: a pool of worker processes in front of app.py.
+
+    python serve.py --workers 9 --threads 4 --port 8000
+
+With gunicorn installed, the parent process preloads the app, tree snapshot
+and hierarchy pages, then forks workers that share them copy-on-write.
+When build_json writes a new tree and no upload or build job is still
+running, the parent reloads its copy and gracefully replaces the workers.
+Without gunicorn (e.g. on Windows) it falls back to a single threaded
+werkzeug server.
+"""
+import os
+import gc
+import sys
+import time
+import signal
+import argparse
+import threading
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = None
+
+import app as webapp
+
+def default_workers():
+    return min((os.cpu_count() or 1) * 2 + 1, 16)
+
+def preload():
+    """
+    Build the shared state, then move it out of the garbage collector's
+    reach so collections in the workers do not touch (and copy) its pages.
+    """
+    webapp.preload_shared_state()
+    gc.collect()
+    if hasattr(gc, "freeze"):
+        gc.freeze()
+
+class TreeWatcher(threading.Thread):
+    """
+    Poll full_org_tree.json and call on_change once a new tree is on disk
+    and no job is still writing the database.
+    """
+    def __init__(self, on_change, poll=5.0):
+        super().__init__(name="tree-watcher", daemon=True)
+        self.on_change = on_change
+        self.poll      = poll
+        self._key      = self._stat_key()
+
+    def _stat_key(self):
+        try:
+            st = os.stat(webapp.tree_snapshot.json_path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def run(self):
+        while True:
+            time.sleep(self.poll)
+            key = self._stat_key()
+            # A build writes the JSON before the index and rollups, so wait
+            # until every job has finished before replacing workers
+            if key != self._key and key is not None and not webapp.job_runner.active():
+                self._key = key
+                try:
+                    self.on_change()
+                except Exception as e:
+                    print(f"Tree reload failed: {e}")
+
+if BaseApplication is not None:
+    class GunicornServer(BaseApplication):
+        """
+        gunicorn arbiter configured in code with the already imported app.
+        """
+        def __init__(self, options, tree_poll):
+            self.options   = options
+            self.tree_poll = tree_poll
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return webapp.app
+
+def _when_ready(server):
+    def reload_workers():
+        print("New org tree on disk; reloading workers")
+        preload()
+        # SIGHUP makes the arbiter start fresh workers from this process,
+        # then retire the old ones once their requests finish
+        os.kill(os.getpid(), signal.SIGHUP)
+    TreeWatcher(reload_workers, poll=server.app.tree_poll).start()
+
+def _worker_exit(server, worker):
+    # Let uploads and builds started by this worker finish before it exits
+    webapp.job_runner.shutdown(wait=True)
+
+def serve(host="0.0.0.0", port=8000, workers=None, threads=4, timeout=120,
+          graceful_timeout=300, tree_poll=5.0, slow_ms=None):
+    if slow_ms is not None:
+        webapp.app.config["SLOW_REQUEST_MS"] = slow_ms
+    preload()
+    if BaseApplication is None or not hasattr(os, "fork"):
+        print("gunicorn not available; serving from one threaded process")
+        webapp.app.run(host=host, port=port, threaded=True, debug=False, use_reloader=False)
+        return
+    options = {
+        "bind": f"{host}:{port}",
+        "workers": workers or default_workers(),
+        "worker_class": "gthread",
+        "threads": threads,
+        "timeout": timeout,
+        "graceful_timeout": graceful_timeout,
+        "preload_app": True,
+        "when_ready": _when_ready,
+        "worker_exit": _worker_exit,
+    }
+    GunicornServer(options, tree_poll).run()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve AFHierarchy with a pool of workers.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: 2 x CPUs + 1, at most 16)")
+    parser.add_argument("--threads", type=int, default=4, help="threads per worker")
+    parser.add_argument("--timeout", type=int, default=120, help="seconds before a stuck worker is restarted")
+    parser.add_argument("--graceful-timeout", type=int, default=300,
+                        help="seconds a retiring worker gets to finish requests and jobs")
+    parser.add_argument("--tree-poll", type=float, default=5.0,
+                        help="seconds between checks for a newly built tree")
+    parser.add_argument("--slow-ms", type=float, default=None,
+                        help="log requests slower than this many milliseconds")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.threads, args.timeout,
+          args.graceful_timeout, args.tree_poll, args.slow_ms)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+import os
+import time
+import gzip
+import hashlib
+import threading
+from collections import namedtuple
+from metrics import TREE_LOAD_SECONDS
+
+# One immutable version of a tree file: its JSON bytes, gzipped bytes and
+# a strong ETag derived from the content.
+Snapshot = namedtuple("Snapshot", ["body", "gzip_body", "etag"])
+
+def make_snapshot(body):
+    """
+    Snapshot of the given JSON bytes.
+    """
+    return Snapshot(
+        body=body,
+        gzip_body=gzip.compress(body, compresslevel=6),
+        etag=hashlib.sha256(body).hexdigest()[:32],
+    )
+
+class TreeSnapshot:
+    """
+    In-memory copy of a tree file (full_org_tree.json or its flat form),
+    kept both plain and gzipped. build_json writes compact JSON, so the
+    bytes are served as they are, without parsing them into nested objects.
+    Reloaded only when the file's mtime or size changes, i.e. when
+    build_json writes a new tree.
+    """
+    def __init__(self, json_path):
+        self.json_path = json_path
+        self._lock     = threading.Lock()
+        self._key      = None
+        self._snap     = None
+        if hasattr(os, "register_at_fork"):
+            # Workers forked mid-reload must not inherit a held lock
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def _stat_key(self):
+        st = os.stat(self.json_path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _load(self):
+        start = time.perf_counter()
+        with open(self.json_path, "rb") as f:
+            body = f.read()
+        snap = make_snapshot(body)
+        TREE_LOAD_SECONDS.observe(time.perf_counter() - start)
+        return snap
+
+    def current(self):
+        """
+        Return the Snapshot matching the file on disk, reloading if needed.
+        Raises FileNotFoundError if no tree has been built yet.
+        """
+        key = self._stat_key()
+        if key != self._key:
+            with self._lock:
+                if key != self._key:
+                    self._snap = self._load()
+                    self._key  = key
+        return self._snap
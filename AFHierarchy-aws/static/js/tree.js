@@ -12,10 +12,10 @@ document.addEventListener("DOMContentLoaded", function() {
   const mdsSelect    = d3.select("#mdsFilter");
   const baseSelect   = d3.select("#baseFilter");
   const statusSelect = d3.select("#statusFilter");
+  const classSelect  = d3.select("#statusClassFilter");
   const dfContainer  = d3.select("#aircraft-table");
 
-  // Status prefixes & colors for the pie chart
-  const ALLOWED_PREFIXES = ["FMC", "PMC", "NMC"];
+  // Status colors for the pie chart
   const STATUS_COLORS = {
     FMC: "#00308F",  // Air Force Blue
     PMC: "#fffb00",  // Cloud Gray
@@ -28,8 +28,14 @@ document.addEventListener("DOMContentLoaded", function() {
   };
 
   // Current data & entity
-  let currentData   = [];
-  let currentEntity = "";
+  const PAGE_SIZE    = 200;
+  let currentData    = [];
+  let currentEntity  = "";
+  let currentPas     = "";
+  let currentSummary = null;
+  let nextAfter      = null;
+  let requestToken   = 0;
+  let chartToken     = 0;
 
   // Columns for the aircraft table
   const columns = [
@@ -114,48 +120,54 @@ document.addEventListener("DOMContentLoaded", function() {
     });
   }
 
-  function populateFilters(data) {
-    const mdsSet = Array.from(new Set(data.map(r => r.mission_design_series).filter(v => v))).sort();
-    mdsSelect.html('<option value="">All</option>');
-    mdsSet.forEach(mds => mdsSelect.append("option").attr("value", mds).text(mds));
+  // Turn a columnar payload ({length, columns}) back into row objects;
+  // dictionary-encoded columns arrive as {dict, codes}
+  function decodeColumnar(payload) {
+    const names = Object.keys(payload.columns);
+    const cols = names.map(n => {
+      const c = payload.columns[n];
+      return Array.isArray(c) ? c : c.codes.map(code => c.dict[code]);
+    });
+    const rows = new Array(payload.length);
+    for (let r = 0; r < payload.length; r++) {
+      const row = {};
+      names.forEach((n, i) => { row[n] = cols[i][r]; });
+      rows[r] = row;
+    }
+    return rows;
+  }
 
-    const baseSet = Array.from(new Set(data.map(r => r.current_assigned_base).filter(v => v))).sort();
-    baseSelect.html('<option value="">All</option>');
-    baseSet.forEach(b => baseSelect.append("option").attr("value", b).text(b));
+  // Rebuild a dropdown from server facet counts, keeping the selection
+  function fillSelect(select, facet) {
+    const selected = select.property("value");
+    select.html('<option value="">All</option>');
+    (facet || []).forEach(f => select.append("option")
+      .attr("value", f.value)
+      .text(`${f.value} (${f.count})`));
+    select.property("value", selected);
+  }
 
-    const statusSet = Array.from(new Set(data.map(r => r.current_condition_detail).filter(v => v))).sort();
-    statusSelect.html('<option value="">All</option>');
-    statusSet.forEach(s => statusSelect.append("option").attr("value", s).text(s));
+  function populateFilters(facets) {
+    fillSelect(mdsSelect, facets.mds);
+    fillSelect(baseSelect, facets.base);
+    fillSelect(statusSelect, facets.status);
+    fillSelect(classSelect, facets.status_prefix);
   }
+  
+    // Render charts and mission capable rate from a precomputed rollup
+    function renderRollup(rollup) {
+      updateStatusChart(rollup.status);
+      updateNMCChart(rollup.nmc);
+      mcRateDiv.text(rollup.mc_rate.toFixed(1) + "%");
+    }
 
-    // Render the table, pie chart, and mission capable rate based on filters
+    // Render the table of loaded rows plus a "Load more" button
     function renderDetails() {
-      const selMds    = mdsSelect.property("value");
-      const selBase   = baseSelect.property("value");
-      const selStatus = statusSelect.property("value");
-  
-      const filtered = currentData.filter(r => {
-        const status = (r.current_condition_detail || "").toLowerCase();
-        const location = (r.location || "").toLowerCase();
-      
-        // Exclude any rows with 'tran' in status or 'in storage' in location
-        if (status.includes("tran") || location.includes("in storage")) return false;
-      
-        return (!selMds    || r.mission_design_series    === selMds) &&
-               (!selBase   || r.current_assigned_base    === selBase) &&
-               (!selStatus || r.current_condition_detail === selStatus);
-      });
-      
-  
-      // Show total count above the table
-      const total = filtered.length;
+      const total = currentSummary ? currentSummary.total : currentData.length;
       dfContainer.html(`<div id="totalCount"><strong>Total Aircraft Assigned: ${total}</strong></div>`);
   
-      if (!total) {
+      if (!currentData.length) {
         dfContainer.append("p").text("No aircraft match these filters.");
-        updateStatusChart({});
-        updateNMCChart({});
-        mcRateDiv.text("0.0%");
         return;
       }
   
@@ -165,51 +177,73 @@ document.addEventListener("DOMContentLoaded", function() {
       columns.forEach(c => thead.append("th").text(c.label));
       const tbody = table.append("tbody");
   
-      // Count statuses for pie chart
-      const counts = { FMC: 0, PMC: 0, NMC: 0 };
-      const nmcTypes = { NMCM: 0, NMCS: 0, NMCB: 0 };
-  
-      filtered.forEach(r => {
-        const st = (r.current_condition_detail || "").toUpperCase();
-        const p = ALLOWED_PREFIXES.find(pref => st.startsWith(pref));
-        if (p) counts[p]++;
-  
-        if (st.startsWith("NMCM")) nmcTypes.NMCM++;
-        if (st.startsWith("NMCS")) nmcTypes.NMCS++;
-        if (st.startsWith("NMCB")) nmcTypes.NMCB++;
-  
-        // Append row
+      currentData.forEach(r => {
         const tr = tbody.append("tr");
         columns.forEach(c => {
           tr.append("td").text(r[c.key] != null ? r[c.key] : "");
         });
       });
-  
-      // Update pie charts
-      updateStatusChart(counts);
-      updateNMCChart(nmcTypes);
-  
-      // Compute and display mission capable rate
-      const mc = counts.FMC + counts.PMC;
-      mcRateDiv.text(((mc / total) * 100).toFixed(1) + "%");
+
+      if (nextAfter) {
+        dfContainer.append("button")
+          .attr("class", "load-more")
+          .text(`Load more (${currentData.length} of ${total})`)
+          .on("click", () => fetchPage(false));
+      }
     }
-  
-    // Load aircraft data for a given list of PAS codes and entity name
-    function loadAircraft(pasList, entityName) {
-      currentEntity = entityName;
-      mcTitle.text(`Mission Capable Rate - ${entityName}`);
-      dfContainer.html("Loading…");
-      mcRateDiv.text("--%");
-  
-      fetch("/api/aircraft?pas_list=" + encodeURIComponent(JSON.stringify(pasList)))
+
+    // The dropdown filters that are set, by parameter name
+    function activeFilters() {
+      const filters = {
+        mds:    mdsSelect.property("value"),
+        base:   baseSelect.property("value"),
+        status: statusSelect.property("value"),
+        status_prefix: classSelect.property("value")
+      };
+      Object.keys(filters).forEach(k => { if (!filters[k]) delete filters[k]; });
+      return filters;
+    }
+
+    // Fetch one page of aircraft for the current PAS and filters; a reset
+    // starts over and also refreshes the facet counts and charts. Charts
+    // show the precomputed rollup when no filter is set, else the page's
+    // filtered summary.
+    function fetchPage(reset) {
+      const params = new URLSearchParams({ limit: PAGE_SIZE, format: "columnar" });
+      if (reset) params.set("facets", "1");
+      else params.set("after", nextAfter);
+      const filters = activeFilters();
+      const filtered = Object.keys(filters).length > 0;
+      Object.keys(filters).forEach(k => params.set(k, filters[k]));
+
+      const token = ++requestToken;
+      if (reset) {
+        dfContainer.html("Loading…");
+        const pas = currentPas;
+        chartToken = token;
+        if (!filtered) {
+          fetch("/api/rollup/" + encodeURIComponent(pas))
+            .then(r => r.ok ? r.json() : null)
+            .then(rollup => {
+              if (rollup && chartToken === token) renderRollup(rollup);
+            })
+            .catch(err => console.error(err));
+        }
+      }
+      return fetch("/api/subtree/" + encodeURIComponent(currentPas) + "/aircraft?" + params)
         .then(r => r.json())
         .then(data => {
-          currentData = data;
-          populateFilters(data);
-          // Reset filters
-          mdsSelect.property("value", "");
-          baseSelect.property("value", "");
-          statusSelect.property("value", "");
+          if (token !== requestToken) return;
+          nextAfter = data.next_after;
+          const rows = decodeColumnar(data.rows);
+          if (reset) {
+            currentData    = rows;
+            currentSummary = data.summary;
+            populateFilters(data.facets);
+            if (filtered) renderRollup(data.summary);
+          } else {
+            currentData = currentData.concat(rows);
+          }
           renderDetails();
         })
         .catch(err => {
@@ -218,154 +252,306 @@ document.addEventListener("DOMContentLoaded", function() {
         });
     }
   
-    // Wire up filter change events
-    mdsSelect.on("change", renderDetails);
-    baseSelect.on("change", renderDetails);
-    statusSelect.on("change", renderDetails);
-    // Collect PAS codes recursively from a tree node
-    function collectPas(node, arr) {
-      arr.push(node.data.PAS);
-      const kids = node.children || node._children;
-      if (kids) kids.forEach(c => collectPas(c, arr));
+    // Load aircraft data for the subtree rooted at a PAS code
+    function loadAircraft(pas, entityName) {
+      currentEntity = entityName;
+      currentPas    = pas;
+      mcTitle.text(`Mission Capable Rate - ${entityName}`);
+      mcRateDiv.text("--%");
+
+      // Reset filters, unless they are pruning the tree
+      if (!pruneToggle.property("checked")) {
+        mdsSelect.property("value", "");
+        baseSelect.property("value", "");
+        statusSelect.property("value", "");
+        classSelect.property("value", "");
+      }
+      fetchPage(true);
     }
   
-    // Render the D3 tree and auto‐load the root node
-    fetch("/data/tree.json?nocache=" + Date.now())
-      .then(r => r.json())
-      .then(treeData => {
-        const margin = { top: 20, right: 120, bottom: 20, left: 120 },
-              width  = window.innerWidth * 0.5 - margin.left - margin.right,
-              height = window.innerHeight    - margin.top  - margin.bottom;
-  
-        const svg = d3.select("#tree-container").append("svg")
-            .attr("width",  width  + margin.left + margin.right)
-            .attr("height", height + margin.top  + margin.bottom)
-            .call(d3.zoom().scaleExtent([0.1, 3]).on("zoom", zoomed));
-  
-        const g = svg.append("g")
-            .attr("transform", `translate(${margin.left},${margin.top})`);
-  
-        function zoomed() {
-          const t = d3.event.transform;
-          g.attr("transform", t);
-          g.selectAll("text").attr("transform", `scale(${1 / t.k})`);
-        }
+    // Wire up filter change events; when "Prune tree" is ticked the tree
+    // is also reloaded, cut down to units with matching aircraft
+    const pruneToggle = d3.select("#pruneTree");
+    const refetch = () => {
+      fetchPage(true);
+      if (pruneToggle.property("checked")) loadTree();
+    };
+    mdsSelect.on("change", refetch);
+    baseSelect.on("change", refetch);
+    statusSelect.on("change", refetch);
+    classSelect.on("change", refetch);
+    pruneToggle.on("change", () => loadTree());
+  
+    // Unit search; revealPath is set once the tree has been drawn
+    const searchInput   = d3.select("#unitSearch");
+    const searchResults = d3.select("#searchResults");
+    let searchTimer     = null;
+    let searchToken     = 0;
+    let revealPath      = null;
+  
+    function runSearch() {
+      const q = searchInput.property("value").trim();
+      const token = ++searchToken;
+      if (!q) {
+        searchResults.selectAll("li").remove();
+        return;
+      }
+      fetch("/api/search?limit=10&q=" + encodeURIComponent(q))
+        .then(r => r.json())
+        .then(res => {
+          if (token !== searchToken) return;  // a newer query is running
+          const items = searchResults.selectAll("li").data(res.hits || [], h => h.PAS);
+          items.exit().remove();
+          const li = items.enter().append("li").merge(items)
+            .html("")
+            .on("click", hit => {
+              searchResults.selectAll("li").remove();
+              if (revealPath) revealPath(hit.path.map(p => p.PAS));
+            });
+          li.append("div").text(h => h.label);
+          li.append("div").attr("class", "path")
+            .text(h => h.path.slice(0, -1).map(p => p.PAS).join(" › "));
+          li.order();
+        })
+        .catch(err => console.error("Search failed:", err));
+    }
+  
+    searchInput.on("input", () => {
+      clearTimeout(searchTimer);
+      searchTimer = setTimeout(runSearch, 200);
+    });
+  
+    // Flat snapshot of the tree (pre-order arrays, see flat_tree.py) when
+    // one is built: levels are then read from the arrays as nodes expand
+    let flat = null;
+  
+    // One node of the flat snapshot; node i's children are i + 1,
+    // end[i + 1], ... up to end[i]
+    function flatNode(i) {
+      let count = 0;
+      for (let j = i + 1; j < flat.end[i]; j = flat.end[j]) count++;
+      return { PAS: flat.pas[i], label: flat.label[i], index: i, child_count: count };
+    }
+  
+    function flatChildren(i) {
+      const kids = [];
+      for (let j = i + 1; j < flat.end[i]; j = flat.end[j]) kids.push(flatNode(j));
+      return kids;
+    }
   
-        const treemap = d3.tree().size([height, width]);
-        const root = d3.hierarchy(treeData, d => d.Children);
-        root.x0 = height / 2;
-        root.y0 = 0;
-  
-        if (root.children) root.children.forEach(collapse);
-        update(root);
-  
-        // Auto‐load root node on page load
-        const rootLabel = root.data.label || "";
-        const parts = rootLabel.split(" - ");
-        const entityName = parts.length > 1 ? parts.slice(1).join(" - ") : rootLabel;
-        const pasList = [];
-        collectPas(root, pasList);
-        loadAircraft(pasList, entityName);
-  
-        function collapse(d) {
-          if (d.children) {
-            d._children = d.children;
-            d._children.forEach(collapse);
-            d.children = null;
+    // Query string selecting the pruned tree for the current filters
+    function treeParams() {
+      const params = new URLSearchParams();
+      if (pruneToggle.property("checked")) {
+        const filters = activeFilters();
+        Object.keys(filters).forEach(k => params.set(k, filters[k]));
+      }
+      const qs = params.toString();
+      return qs ? "?" + qs : "";
+    }
+  
+    let treeToken = 0;
+  
+    // Render the D3 tree from the root level; deeper levels come from the
+    // flat snapshot, or from /api/tree/children when there is none. The
+    // first load also shows the root node's aircraft; later loads (filters
+    // changed) replace only the drawing.
+    function loadTree() {
+      const token = ++treeToken;
+      return fetch("/data/tree_flat.json" + treeParams())
+        .then(r => r.ok ? r.json() : null)
+        .then(data => {
+          if (token !== treeToken) return null;  // a newer filter is loading
+          flat = data;
+          return flat ? flatNode(0) : fetch("/api/tree/root").then(r => r.json());
+        })
+        .then(treeData => {
+          if (!treeData || token !== treeToken) return;
+          d3.select("#tree-container").select("svg").remove();
+          const margin = { top: 20, right: 120, bottom: 20, left: 120 },
+                width  = window.innerWidth * 0.5 - margin.left - margin.right,
+                height = window.innerHeight    - margin.top  - margin.bottom;
+  
+          const svg = d3.select("#tree-container").append("svg")
+              .attr("width",  width  + margin.left + margin.right)
+              .attr("height", height + margin.top  + margin.bottom)
+              .call(d3.zoom().scaleExtent([0.1, 3]).on("zoom", zoomed));
+  
+          const g = svg.append("g")
+              .attr("transform", `translate(${margin.left},${margin.top})`);
+  
+          function zoomed() {
+            const t = d3.event.transform;
+            g.attr("transform", t);
+            g.selectAll("text").attr("transform", `scale(${1 / t.k})`);
           }
-        }
   
-        function update(source) {
-          const treeDataLayout = treemap(root);
-          const nodes = treeDataLayout.descendants(),
-                links = nodes.slice(1);
+          const treemap = d3.tree().size([height, width]);
+          const root = d3.hierarchy(treeData, d => d.Children);
+          root.x0 = height / 2;
+          root.y0 = 0;
   
-          nodes.forEach(d => d.y = d.depth * 180);
+          update(root);
   
-          // NODES
-          const node = g.selectAll("g.node")
-              .data(nodes, d => d.id || (d.id = ++i));
+          // Auto‐load root node on page load
+          if (token === 1) {
+            const rootLabel = root.data.label || "";
+            const parts = rootLabel.split(" - ");
+            const entityName = parts.length > 1 ? parts.slice(1).join(" - ") : rootLabel;
+            loadAircraft(root.data.PAS, entityName);
+          }
   
-          const nodeEnter = node.enter().append("g")
-              .attr("class", "node")
-              .attr("transform", d => `translate(${source.y0},${source.x0})`)
-              .on("click", d => {
-                click(d);
-                const lbl = d.data.label || "";
-                const parts = lbl.split(" - ");
-                const name = parts.length > 1 ? parts.slice(1).join(" - ") : lbl;
-                const pasList = [];
-                collectPas(d, pasList);
-                loadAircraft(pasList, name);
-              });
+          // True if the node has children that are hidden or not fetched yet
+          function hasHidden(d) {
+            return !!d._children || (!d.children && d.data.child_count > 0);
+          }
   
-          nodeEnter.append("circle")
-              .attr("r", 1e-6)
-              .style("fill", d => d._children ? "lightsteelblue" : "#fff");
+          // Fetch one level below d and attach it as collapsed D3 nodes
+          function loadChildren(d) {
+            const level = flat
+              ? Promise.resolve(flatChildren(d.data.index))
+              : fetch("/api/tree/children/" + encodeURIComponent(d.data.PAS)).then(r => r.json());
+            return level
+              .then(kids => {
+                d.data.Children = kids;
+                d.children = kids.map(k => {
+                  const n = d3.hierarchy(k, () => null);
+                  n.parent = d;
+                  n.depth  = d.depth + 1;
+                  return n;
+                });
+              });
+          }
   
-          nodeEnter.append("text")
-              .attr("dy", ".35em")
-              .attr("x", d => d.children || d._children ? -13 : 13)
-              .attr("text-anchor", d => d.children || d._children ? "end" : "start")
-              .text(d => {
-                const lbl = d.data.label || "";
-                const parts = lbl.split(" - ");
-                return parts.length > 1 ? parts.slice(1).join(" - ") : lbl;
-              })
-              .style("cursor", "pointer");
-  
-          const nodeUpdate = nodeEnter.merge(node);
-          nodeUpdate.transition().duration(duration)
-              .attr("transform", d => `translate(${d.y},${d.x})`);
-          nodeUpdate.select("circle")
-              .attr("r", 10)
-              .style("fill", d => d._children ? "lightsteelblue" : "#fff");
-  
-          const nodeExit = node.exit().transition().duration(duration)
-              .attr("transform", d => `translate(${source.y},${source.x})`)
-              .remove();
-          nodeExit.select("circle").attr("r", 1e-6);
-          nodeExit.select("text").style("fill-opacity", 1e-6);
-  
-          // LINKS
-          const link = g.selectAll("path.link")
-              .data(links, d => d.id);
-          const linkEnter = link.enter().insert("path", "g")
-              .attr("class", "link")
-              .attr("d", d => {
-                const o = { x: source.x0, y: source.y0 };
-                return diagonal(o, o);
+          // Expand every branch along path (PAS codes, root first), loading
+          // levels as needed, then select the last node and show its aircraft
+          revealPath = function(path) {
+            let d = root;
+            const step = k => {
+              if (k >= path.length) return Promise.resolve(d);
+              const ready = (!d.children && !d._children && d.data.child_count > 0)
+                ? loadChildren(d)
+                : Promise.resolve();
+              return ready.then(() => {
+                if (d._children) {
+                  d.children = d._children;
+                  d._children = null;
+                }
+                const next = (d.children || []).find(c => c.data.PAS === path[k]);
+                if (!next) return d;
+                d = next;
+                return step(k + 1);
               });
-          linkEnter.merge(link).transition().duration(duration)
-              .attr("d", d => diagonal(d.parent, d));
-          link.exit().transition().duration(duration)
-              .attr("d", d => {
-                const o = { x: source.x, y: source.y };
-                return diagonal(o, o);
+            };
+            return step(1)
+              .then(target => {
+                update(root);
+                g.selectAll("g.node").classed("selected", n => n === target);
+                const lbl = target.data.label || "";
+                const parts = lbl.split(" - ");
+                loadAircraft(target.data.PAS, parts.length > 1 ? parts.slice(1).join(" - ") : lbl);
               })
-              .remove();
-  
-          nodes.forEach(d => { d.x0 = d.x; d.y0 = d.y; });
-        }
+              .catch(err => console.error("Failed to expand to search hit:", err));
+          };
+  
+          function update(source) {
+            const treeDataLayout = treemap(root);
+            const nodes = treeDataLayout.descendants(),
+                  links = nodes.slice(1);
+  
+            nodes.forEach(d => d.y = d.depth * 180);
+  
+            // NODES
+            const node = g.selectAll("g.node")
+                .data(nodes, d => d.id || (d.id = ++i));
+  
+            const nodeEnter = node.enter().append("g")
+                .attr("class", "node")
+                .attr("transform", d => `translate(${source.y0},${source.x0})`)
+                .on("click", d => {
+                  click(d);
+                  g.selectAll("g.node").classed("selected", n => n === d);
+                  const lbl = d.data.label || "";
+                  const parts = lbl.split(" - ");
+                  const name = parts.length > 1 ? parts.slice(1).join(" - ") : lbl;
+                  loadAircraft(d.data.PAS, name);
+                });
+  
+            nodeEnter.append("circle")
+                .attr("r", 1e-6)
+                .style("fill", d => hasHidden(d) ? "lightsteelblue" : "#fff");
+  
+            nodeEnter.append("text")
+                .attr("dy", ".35em")
+                .attr("x", d => d.data.child_count > 0 ? -13 : 13)
+                .attr("text-anchor", d => d.data.child_count > 0 ? "end" : "start")
+                .text(d => {
+                  const lbl = d.data.label || "";
+                  const parts = lbl.split(" - ");
+                  return parts.length > 1 ? parts.slice(1).join(" - ") : lbl;
+                })
+                .style("cursor", "pointer");
+  
+            const nodeUpdate = nodeEnter.merge(node);
+            nodeUpdate.transition().duration(duration)
+                .attr("transform", d => `translate(${d.y},${d.x})`);
+            nodeUpdate.select("circle")
+                .attr("r", 10)
+                .style("fill", d => hasHidden(d) ? "lightsteelblue" : "#fff");
+  
+            const nodeExit = node.exit().transition().duration(duration)
+                .attr("transform", d => `translate(${source.y},${source.x})`)
+                .remove();
+            nodeExit.select("circle").attr("r", 1e-6);
+            nodeExit.select("text").style("fill-opacity", 1e-6);
+  
+            // LINKS
+            const link = g.selectAll("path.link")
+                .data(links, d => d.id);
+            const linkEnter = link.enter().insert("path", "g")
+                .attr("class", "link")
+                .attr("d", d => {
+                  const o = { x: source.x0, y: source.y0 };
+                  return diagonal(o, o);
+                });
+            linkEnter.merge(link).transition().duration(duration)
+                .attr("d", d => diagonal(d.parent, d));
+            link.exit().transition().duration(duration)
+                .attr("d", d => {
+                  const o = { x: source.x, y: source.y };
+                  return diagonal(o, o);
+                })
+                .remove();
+  
+            nodes.forEach(d => { d.x0 = d.x; d.y0 = d.y; });
+          }
   
-        function diagonal(s, d) {
-          return `M ${s.y} ${s.x}
-                  C ${(s.y + d.y)/2} ${s.x},
-                    ${(s.y + d.y)/2} ${d.x},
-                    ${d.y} ${d.x}`;
-        }
+          function diagonal(s, d) {
+            return `M ${s.y} ${s.x}
+                    C ${(s.y + d.y)/2} ${s.x},
+                      ${(s.y + d.y)/2} ${d.x},
+                      ${d.y} ${d.x}`;
+          }
   
-        function click(d) {
-          if (d.children) {
-            d._children = d.children;
-            d.children = null;
-          } else {
-            d.children = d._children;
-            d._children = null;
+          function click(d) {
+            if (d.children) {
+              d._children = d.children;
+              d.children = null;
+            } else if (d._children) {
+              d.children = d._children;
+              d._children = null;
+            } else if (d.data.child_count > 0) {
+              loadChildren(d)
+                .then(() => update(d))
+                .catch(err => console.error("Failed to load children:", err));
+              return;
+            }
+            update(d);
           }
-          update(d);
-        }
-      })
-      .catch(err => console.error("Failed to load tree data:", err));
+        })
+        .catch(err => console.error("Failed to load tree data:", err));
+    }
+  
+    loadTree();
   });
   
\ No newline at end of file
@@ -0,0 +1,46 @@
+import threading
+import time
+from jobs import JobRunner
+
+def _recorder(order, name, delay=0.0):
+    def fn(progress):
+        time.sleep(delay)
+        order.append(name)
+    return fn
+
+def test_jobs_on_a_resource_run_in_submission_order():
+    for _ in range(30):
+        runner = JobRunner(workers=2)
+        order = []
+        runner.submit("org", _recorder(order, "org", 0.05), resources=("data.db",))
+        runner.submit("aircraft", _recorder(order, "aircraft"), resources=("data.db",))
+        runner.submit("build", _recorder(order, "build"), resources=("data.db",))
+        runner.shutdown()
+        assert order == ["org", "aircraft", "build"]
+
+def test_jobs_on_overlapping_resources_keep_order(tmp_path):
+    runner = JobRunner(workers=4, state_dir=str(tmp_path))
+    order = []
+    runner.submit("a", _recorder(order, "a", 0.05), resources=("data.db",))
+    runner.submit("b", _recorder(order, "b"), resources=("data.db", "tree"))
+    runner.submit("c", _recorder(order, "c"), resources=("tree",))
+    runner.shutdown()
+    assert order == ["a", "b", "c"]
+
+def test_unrelated_jobs_run_in_parallel():
+    runner = JobRunner(workers=2)
+    started = threading.Barrier(2, timeout=5)
+    runner.submit("a", lambda progress: started.wait(), resources=("data.db",))
+    b = runner.submit("b", lambda progress: started.wait(), resources=("tree",))
+    runner.shutdown()
+    assert b.state == "done"
+
+def test_failed_job_does_not_block_the_queue():
+    runner = JobRunner(workers=2)
+    def boom(progress):
+        raise RuntimeError("boom")
+    failed = runner.submit("a", boom, resources=("data.db",))
+    after  = runner.submit("b", lambda progress: ("ok", None), resources=("data.db",))
+    runner.shutdown()
+    assert failed.state == "failed" and failed.error == "boom"
+    assert after.state == "done" and after.message == "ok"
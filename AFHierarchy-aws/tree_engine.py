@@ -0,0 +1,219 @@
+import json
+import numpy as np
+import pandas as pd
+
+def _text(col, strip=False):
+    """
+    Object array of str(value) for every value in a column ("nan" for
+    missing ones), matching the row-by-row path this replaces, optionally
+    stripped. String columns are stripped before leaving pandas; nothing
+    else goes through its arrow-backed string conversions.
+    """
+    if pd.api.types.is_string_dtype(col):
+        if strip:
+            col = col.str.strip()
+        return col.to_numpy(dtype=object, na_value="nan")
+    values = [str(v) for v in col.to_numpy(dtype=object)]
+    return np.array([v.strip() for v in values] if strip else values, dtype=object)
+
+class OrgTree:
+    """
+    Org hierarchy held as parallel arrays instead of nested dicts.
+
+    Node i has pas[i], label[i], grouped[i] (grouped organization name) and
+    parent_pas[i] (the raw parent code from the org table), and parent[i],
+    the array index of its parent or -1. Only nodes reachable from root
+    take part in traversal, pruning and serialization.
+    """
+    def __init__(self, pas, label, grouped, parent_pas, parent, root):
+        self.pas        = pas
+        self.label      = label
+        self.grouped    = grouped
+        self.parent_pas = parent_pas
+        self.parent     = parent
+        self.root       = root
+        self._preorder  = None
+
+    def __len__(self):
+        return len(self.pas)
+
+    @classmethod
+    def from_frame(cls, df, root_pas):
+        """
+        Build from an org frame with pas, parent_pas, organization_no, unit and
+        grouped_name columns. A PAS listed twice keeps its first position and
+        its last row's values. Raises KeyError if root_pas is missing.
+        """
+        pas = _text(df["pas"], strip=True)
+        # First position per PAS (factorize keeps first-seen order), values
+        # from its last row
+        codes, pas_arr = pd.factorize(pas)
+        _, from_end = np.unique(codes[::-1], return_index=True)
+        nodes = df.iloc[len(codes) - 1 - from_end]
+
+        parent_pas = _text(nodes["parent_pas"], strip=True)
+        parent_pas[nodes["parent_pas"].isna().to_numpy()] = ""
+        label   = _text(nodes["organization_no"], strip=True) + " - " + _text(nodes["unit"])
+        grouped = _text(nodes["grouped_name"])
+
+        # Hash join of parent codes onto node positions (-1 = no parent), on
+        # an object index so no arrow strings are built
+        position = pd.Index(pas_arr, dtype=object)
+        parent = position.get_indexer(parent_pas).astype(np.int64)
+
+        root = position.get_indexer([root_pas])[0]
+        if root < 0:
+            raise KeyError(f"PAS '{root_pas}' not found; cannot set it as root.")
+        parent[root] = -1
+
+        return cls(np.asarray(pas_arr, dtype=object), label, grouped, parent_pas, parent, root)
+
+    def preorder(self):
+        """
+        Return (order, depth): node indexes reachable from root in pre-order,
+        children in table order, and each one's depth. Vectorized one tree
+        level at a time, so deep hierarchies cannot hit the recursion limit.
+        """
+        if self._preorder is not None:
+            return self._preorder
+        n = len(self)
+        # CSR child lists: children of i are kids[starts[i]:starts[i + 1]]
+        has_parent = self.parent >= 0
+        kids = np.flatnonzero(has_parent)
+        kids = kids[np.argsort(self.parent[kids], kind="stable")]
+        starts = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.parent[has_parent], minlength=n), out=starts[1:])
+
+        # Each node has one parent, so walking child lists down from root
+        # visits every reachable node exactly once; parent cycles stay
+        # unreachable. Levels are gathered whole, each one grouped by parent
+        # in the order of the level above
+        levels = [np.array([self.root], dtype=np.int64)]
+        while True:
+            above = levels[-1]
+            counts = starts[above + 1] - starts[above]
+            total = int(counts.sum())
+            if not total:
+                break
+            first = np.repeat(starts[above] - (np.cumsum(counts) - counts), counts)
+            levels.append(kids[first + np.arange(total)])
+
+        size = np.ones(n, dtype=np.int64)
+        for level in reversed(levels[1:]):
+            np.add.at(size, self.parent[level], size[level])
+
+        # A child's pre-order position is its parent's plus one plus the
+        # subtree sizes of its earlier siblings
+        position = np.zeros(n, dtype=np.int64)
+        depth = np.zeros(n, dtype=np.int64)
+        for d, level in enumerate(levels[1:], 1):
+            parent = self.parent[level]
+            before = np.cumsum(size[level]) - size[level]
+            group_start = np.concatenate(([True], parent[1:] != parent[:-1]))
+            before -= np.maximum.accumulate(np.where(group_start, before, 0))
+            position[level] = position[parent] + 1 + before
+            depth[level] = d
+
+        reachable = np.concatenate(levels)
+        order = np.empty(len(reachable), dtype=np.int64)
+        order[position[reachable]] = reachable
+        self._preorder = (order, depth[order])
+        return self._preorder
+
+    def _bottom_up(self, values, combine):
+        """
+        Fold values from children into parents, deepest level first, one
+        vectorized ufunc.at call per level. Modifies values in place.
+        """
+        order, depth = self.preorder()
+        by_level = order[np.argsort(depth, kind="stable")]
+        bounds = np.searchsorted(np.sort(depth), np.arange(depth.max(initial=0) + 2))
+        for d in range(depth.max(initial=0), 0, -1):
+            level = by_level[bounds[d]:bounds[d + 1]]
+            combine.at(values, self.parent[level], values[level])
+        return values
+
+    def subset(self, keep):
+        """
+        Return a new OrgTree with only the nodes where keep is True.
+        Parents of kept nodes must also be kept.
+        """
+        idx = np.flatnonzero(keep)
+        remap = np.full(len(self), -1, dtype=np.int64)
+        remap[idx] = np.arange(len(idx))
+        parent = self.parent[idx]
+        parent = np.where(parent >= 0, remap[np.maximum(parent, 0)], -1)
+        return OrgTree(
+            self.pas[idx], self.label[idx], self.grouped[idx],
+            self.parent_pas[idx], parent, remap[self.root],
+        )
+
+    def pruned(self, valid_pas):
+        """
+        Keep root, nodes whose PAS is in valid_pas, and their ancestors.
+        """
+        order, _ = self.preorder()
+        keep = np.zeros(len(self), dtype=bool)
+        # A set lookup per node; pandas isin would go through arrow strings
+        valid_pas = set(valid_pas)
+        keep[order] = [p in valid_pas for p in self.pas[order].tolist()]
+        self._bottom_up(keep, np.logical_or)
+        keep[self.root] = True
+        reachable = np.zeros(len(self), dtype=bool)
+        reachable[order] = True
+        return self.subset(keep & reachable)
+
+    def intervals(self):
+        """
+        Rows of (pas, parent_pas, label, lft, rgt, depth) with pre-order lft
+        and rgt the pre-order index of the node's last descendant.
+        """
+        order, depth = self.preorder()
+        size = np.zeros(len(self), dtype=np.int64)
+        size[order] = 1
+        self._bottom_up(size, np.add)
+        lft = np.arange(len(order))
+        rgt = lft + size[order] - 1
+        parent = self.parent[order]
+        parent_pas = np.where(parent >= 0, self.pas[np.maximum(parent, 0)], "")
+        return list(zip(
+            self.pas[order].tolist(), parent_pas.tolist(), self.label[order].tolist(),
+            lft.tolist(), rgt.tolist(), depth.tolist(),
+        ))
+
+    def flat(self):
+        """
+        Pre-order parallel arrays (pas, label, parent, end): parent is the
+        pre-order index of each node's parent (-1 for root) and end is one
+        past the pre-order index of its last descendant.
+        """
+        order, _ = self.preorder()
+        size = np.zeros(len(self), dtype=np.int64)
+        size[order] = 1
+        self._bottom_up(size, np.add)
+        position = np.full(len(self), -1, dtype=np.int64)
+        position[order] = np.arange(len(order))
+        parent = self.parent[order]
+        parent = np.where(parent >= 0, position[np.maximum(parent, 0)], -1)
+        end = np.arange(len(order)) + size[order]
+        return self.pas[order].tolist(), self.label[order].tolist(), parent, end
+
+    def to_json(self):
+        """
+        Serialize straight from the arrays to the nested
+        {"PAS", "label", "parent_pas", "Children"} JSON format.
+        """
+        order, depth = self.preorder()
+        dumps = json.dumps
+        parts = []
+        prev = -1
+        for i, d in zip(order.tolist(), depth.tolist()):
+            if prev >= d:
+                parts.append("]}" * (prev - d + 1) + ",")
+            parts.append(
+                f'{{"PAS":{dumps(self.pas[i])},"label":{dumps(self.label[i])},'
+                f'"parent_pas":{dumps(self.parent_pas[i])},"Children":['
+            )
+            prev = d
+        parts.append("]}" * (prev + 1))
+        return "".join(parts)
@@ -0,0 +1,160 @@
+import gzip
+import json
+import time
+import zlib
+from flask.json.provider import DefaultJSONProvider
+from metrics import JSON_SECONDS
+
+# orjson is optional; when installed it replaces the stdlib encoder
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Responses smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = 1024
+COMPRESSIBLE_TYPES = {"application/json", "text/html", "text/css", "application/javascript"}
+STREAM_BATCH_ROWS  = 1000
+
+# Columns whose values repeat heavily across aircraft rows and are sent
+# dictionary-encoded in the columnar format
+DICT_COLUMNS = {
+    "mission_design_series",
+    "current_assigned_base",
+    "current_condition_detail",
+    "active_inventory",
+    "assigned_unit_pas",
+}
+
+COLUMNAR_MIMETYPE = "application/vnd.afh.columnar+json"
+
+def wants_columnar(request):
+    """
+    True if the client opted into the columnar format, with format=columnar
+    or by preferring COLUMNAR_MIMETYPE in its Accept header.
+    """
+    fmt = request.args.get("format")
+    if fmt:
+        return fmt == "columnar"
+    best = request.accept_mimetypes.best_match(["application/json", COLUMNAR_MIMETYPE])
+    return best == COLUMNAR_MIMETYPE
+
+def encode_rows(cols, rows, columnar=False):
+    """
+    Encode row tuples either as a list of dicts or, with columnar=True, as
+    {"length", "columns"} with one array per column. DICT_COLUMNS are sent
+    as {"dict": [distinct values], "codes": [index per row]}.
+    """
+    if not columnar:
+        return [dict(zip(cols, row)) for row in rows]
+    columns = {}
+    for i, col in enumerate(cols):
+        values = [row[i] for row in rows]
+        if col in DICT_COLUMNS:
+            lookup = {}
+            codes = [lookup.setdefault(v, len(lookup)) for v in values]
+            columns[col] = {"dict": list(lookup), "codes": codes}
+        else:
+            columns[col] = values
+    return {"format": "columnar", "length": len(rows), "columns": columns}
+
+def dumps(obj):
+    """
+    Serialize obj to JSON bytes with the fastest available encoder.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider that encodes with orjson when it is installed and
+    falls back to Flask's default encoder for anything orjson rejects.
+    """
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            try:
+                return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+            except TypeError:
+                pass
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        start = time.perf_counter()
+        body = self.dumps(obj)
+        JSON_SECONDS.observe(time.perf_counter() - start)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+def json_array_chunks(cols, cursor, batch=STREAM_BATCH_ROWS):
+    """
+    Yield a JSON array of row dicts piece by piece, fetching batch rows at a
+    time from cursor, so the whole body is never held in memory.
+    """
+    yield b"["
+    first = True
+    encoding = 0.0
+    while True:
+        rows = cursor.fetchmany(batch)
+        if not rows:
+            break
+        # Encode the batch as one array and drop its brackets
+        start = time.perf_counter()
+        body = dumps([dict(zip(cols, row)) for row in rows])[1:-1]
+        encoding += time.perf_counter() - start
+        yield body if first else b"," + body
+        first = False
+    JSON_SECONDS.observe(encoding)
+    yield b"]"
+
+def _pick_encoding(request):
+    accepted = request.accept_encodings
+    for encoding in ("gzip", "deflate"):
+        if encoding in accepted:
+            return encoding
+    return None
+
+def _compressor(encoding):
+    # wbits 31 writes a gzip container, 15 a zlib (HTTP "deflate") stream
+    return zlib.compressobj(6, zlib.DEFLATED, 31 if encoding == "gzip" else 15)
+
+def _compress_stream(chunks, encoding):
+    comp = _compressor(encoding)
+    for chunk in chunks:
+        data = comp.compress(chunk)
+        if data:
+            yield data
+    yield comp.flush()
+
+def compress_response(request, response):
+    """
+    after_request hook: gzip or deflate compressible responses above
+    COMPRESS_MIN_BYTES when the client accepts it. Streamed responses are
+    compressed incrementally as they are sent.
+
+    Responses carrying an ETag are left alone: the ETag names one
+    representation, and _snapshot_response already picks its encoding.
+    """
+    if (response.status_code != 200
+            or "Content-Encoding" in response.headers
+            or "ETag" in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    encoding = _pick_encoding(request)
+    response.vary.add("Accept-Encoding")
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        body = response.get_data()
+        if len(body) < COMPRESS_MIN_BYTES:
+            return response
+        if encoding == "gzip":
+            response.set_data(gzip.compress(body, compresslevel=6))
+        else:
+            response.set_data(zlib.compress(body, 6))
+    response.headers["Content-Encoding"] = encoding
+    return response